@@ -1,27 +1,48 @@
-import random
+import time
 import re
 import traceback
 import sys
 import os
 from pathlib import Path
-from typing import Optional, Tuple
-import concurrent.futures
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
 from loguru import logger
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # Handle imports for both package and direct script execution
 if __name__ == "__main__":
     # When run directly, add parent directory to path
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from src.utils import calculate_normal_hash, getConfig, getArticlePathsForQuery
-    from src.textExtraction import extract_text_from_file, TextExtractionError
+    from src.utils import (
+        calculate_normal_hash,
+        calculate_normal_hashes,
+        getConfig,
+        getArticlePathsForQuery,
+    )
+    import src.utils as utils
+    from src.textExtraction import (
+        extract_text_from_file,
+        assess_text_insufficiency,
+        TextExtractionError,
+    )
     import src.db as db
+    import src.llm as llm
 else:
     # When imported as a module
-    from .utils import calculate_normal_hash, getConfig, getArticlePathsForQuery
-    from .textExtraction import extract_text_from_file, TextExtractionError
+    from .utils import (
+        calculate_normal_hash,
+        calculate_normal_hashes,
+        getConfig,
+        getArticlePathsForQuery,
+    )
+    from . import utils
+    from .textExtraction import (
+        extract_text_from_file,
+        assess_text_insufficiency,
+        TextExtractionError,
+    )
     from . import db
+    from . import llm
 
 # Configure loguru logger
 log_file_path = os.path.join(
@@ -65,11 +86,73 @@ def setup_database() -> str:
     return db.setup_database()
 
 
-def summarize_with_openrouter(text: str) -> Tuple[str, bool]:
-    """Generate a summary of the text using the OpenRouter API.
+# Prefix of the message returned when no summary could be generated; such
+# results are not stored, so the article is retried in a later session
+SUMMARY_FAILURE_PREFIX = "Failed to generate summary"
+# Bump when the summary prompt changes meaningfully, so cached responses to
+# the old prompt are no longer reused
+SUMMARY_PROMPT_VERSION = 1
+# Articles whose summarization keeps failing wait this long before the next
+# attempt, doubling after every consecutive failure up to the maximum
+DEFAULT_SUMMARY_RETRY_BASE_HOURS = 1
+SUMMARY_RETRY_MAX_DAYS = 30
+# Texts the local pre-filter is at least this confident are insufficient are
+# marked failed_to_summarise without calling the model; 0 disables it
+DEFAULT_PREFILTER_THRESHOLD = 0.8
+PREFILTER_SUMMARY_PREFIX = "[INSUFFICIENT_TEXT] Local pre-filter"
+
+
+def _build_summary_messages(text: str) -> List[Dict[str, str]]:
+    system_prompt = (
+        "You are a helpful system that generates concise summaries of academic or educational content. "
+        "You must first assess if the provided text contains sufficient content to generate a meaningful summary. "
+        "If the text is too short, fragmented, or lacks substantive content, respond with "
+        '"<summary>[INSUFFICIENT_TEXT]</summary>" at the beginning of your response. '
+        "DO NOT respond with [INSUFFICIENT_TEXT] if there is substantive content but the text merely ends abruptly/not at the end of a sentence. "
+        "ALWAYS return your summary enclosed within <summary></summary> tags. "
+        "ONLY put the summary itself inside these tags, not any other part of your response."
+    )
 
-    Args:
-        text: Text to summarize
+    user_prompt = (
+        f"Please analyze the following text:\n\n{text}\n\n"
+        "First, determine if the text provides enough substantial content to write a meaningful summary. "
+        "If the text is too short, fragmented, or clearly not the full article (e.g., just metadata, table of contents, or a small snippet), "
+        'respond with "<summary>[INSUFFICIENT_TEXT]</summary>" followed by a brief explanation of why the text is insufficient.\n\n'
+        "If the text IS sufficient, please summarize it in a concise but informative way that captures the main arguments, principles, "
+        'concepts, cruxes, intuitions, explanations and conclusions. Do not say things like "the author argues that..." or '
+        '"the text explains how...".\n\n'
+        "IMPORTANT: Return ONLY your summary enclosed within <summary></summary> tags. Do not include any other text outside these tags."
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _parse_summary_response(full_response: str) -> Tuple[str, bool]:
+    summary_match = re.search(r"<summary>(.*?)</summary>", full_response, re.DOTALL)
+    if summary_match:
+        summary = summary_match.group(1).strip()
+    else:
+        error_message = "Summary tags not found in model response"
+        logger.error(f"{error_message}. Response: {full_response}")
+        return f"{SUMMARY_FAILURE_PREFIX}: {error_message}", False
+
+    if summary.startswith("[INSUFFICIENT_TEXT]"):
+        logger.debug(f"Insufficient text detected: {summary}")
+        return summary, False
+
+    return summary, True
+
+
+def _is_cacheable_summary_response(full_response: str) -> bool:
+    return re.search(r"<summary>(.*?)</summary>", full_response, re.DOTALL) is not None
+
+
+async def summarize_with_openrouter_async(
+    engine: "llm.LLMEngine", text: str
+) -> Tuple[str, bool]:
+    """Generate a summary of the text on a shared engine.
 
     Returns:
         Tuple[str, bool]: Generated summary and flag indicating if the text was sufficient.
@@ -78,176 +161,173 @@ def summarize_with_openrouter(text: str) -> Tuple[str, bool]:
         logger.warning("No text to summarize")
         return "No text to summarize", False
 
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        logger.error("OPENROUTER_API_KEY not found in environment variables")
-        raise ValueError("OPENROUTER_API_KEY not found in environment variables")
+    try:
+        full_response = await engine.complete(
+            _build_summary_messages(text),
+            cache_version=SUMMARY_PROMPT_VERSION,
+            cacheable=_is_cacheable_summary_response,
+        )
+        return _parse_summary_response(full_response)
+    except Exception as e:
+        error_message = f"Error generating summary: {type(e).__name__}: {e}"
+        logger.error(f"{error_message}\n{traceback.format_exc()}")
+        return f"{SUMMARY_FAILURE_PREFIX}: {error_message}", False
 
-    config = getConfig()
-    model = config.get("ai_model")
 
+def _get_existing_summary(file_hash: str, file_name: str) -> Optional[Tuple[str, bool]]:
+    """Return the stored (summary, is_sufficient) for a hash, or None if it needs one."""
+    article = db.get_article_by_hash(file_hash)
+    if not article:
+        return None
+    status = article["status"]
+    if status == db.STATUS_INSUFFICIENT_TEXT:
+        logger.debug(f"Skipping file {file_name} due to previous insufficient text")
+        return "failed_to_summarise", False
+    elif status == db.STATUS_EXTRACTION_FAILED:
+        logger.debug(f"Skipping file {file_name} due to previous extraction issues")
+        return "failed_to_extract", False
+    elif status == db.STATUS_SUMMARIZED:
+        # Article has a valid summary, return it
+        logger.debug(f"Using existing summary for {file_name}")
+        return article["summary"], True
+    return None
+
+
+def _record_summary_failure(file_hash: str, file_name: str, error: str) -> None:
+    """Note a failed attempt in the failure ledger so the article backs off."""
+    base_hours = float(
+        getConfig().get("summary_retry_base_hours", DEFAULT_SUMMARY_RETRY_BASE_HOURS)
+    )
     try:
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-        logger.debug(f"Sending summary request to OpenRouter with model: {model}")
-
-        system_prompt = (
-            "You are a helpful system that generates concise summaries of academic or educational content. "
-            "You must first assess if the provided text contains sufficient content to generate a meaningful summary. "
-            "If the text is too short, fragmented, or lacks substantive content, respond with "
-            '"<summary>[INSUFFICIENT_TEXT]</summary>" at the beginning of your response. '
-            "DO NOT respond with [INSUFFICIENT_TEXT] if there is substantive content but the text merely ends abruptly/not at the end of a sentence. "
-            "ALWAYS return your summary enclosed within <summary></summary> tags. "
-            "ONLY put the summary itself inside these tags, not any other part of your response."
+        attempts, next_attempt_at = db.record_summary_failure(
+            file_hash,
+            error[:500],
+            base_hours * 3600,
+            SUMMARY_RETRY_MAX_DAYS * 86400,
         )
+    except Exception as e:
+        logger.error(f"Could not record failed summary attempt for {file_name}: {e}")
+        return
+    logger.info(
+        f"Summary attempt {attempts} failed for {file_name}, next try in "
+        f"{(next_attempt_at - time.time()) / 3600:.1f} hours"
+    )
 
-        user_prompt = (
-            f"Please analyze the following text:\n\n{text}\n\n"
-            "First, determine if the text provides enough substantial content to write a meaningful summary. "
-            "If the text is too short, fragmented, or clearly not the full article (e.g., just metadata, table of contents, or a small snippet), "
-            'respond with "<summary>[INSUFFICIENT_TEXT]</summary>" followed by a brief explanation of why the text is insufficient.\n\n'
-            "If the text IS sufficient, please summarize it in a concise but informative way that captures the main arguments, principles, "
-            'concepts, cruxes, intuitions, explanations and conclusions. Do not say things like "the author argues that..." or '
-            '"the text explains how...".\n\n'
-            "IMPORTANT: Return ONLY your summary enclosed within <summary></summary> tags. Do not include any other text outside these tags."
-        )
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+def _summary_to_store(file_path: str, summary: str, is_sufficient: bool) -> str:
+    """Map a model response to the value stored in the summary column."""
+    logger.debug(
+        f"Summary generated for {os.path.basename(file_path)}: is_sufficient={is_sufficient}, length={len(summary)} chars"
+    )
+    if not is_sufficient:
+        logger.warning(
+            f"Insufficient text for file: {file_path}, marking as failed_to_summarise: {summary}"
         )
-        full_response = response.choices[0].message.content
+        return "failed_to_summarise"
+    logger.debug(f"Successfully created summary for file: {file_path}")
+    return summary
 
-        summary_match = re.search(r"<summary>(.*?)</summary>", full_response, re.DOTALL)
-        if summary_match:
-            summary = summary_match.group(1).strip()
-        else:
-            error_message = "Summary tags not found in model response"
-            logger.error(f"{error_message}. Response: {full_response}")
-            return f"Failed to generate summary: {error_message}", False
 
-        if summary.startswith("[INSUFFICIENT_TEXT]"):
-            logger.debug(f"Insufficient text detected: {summary}")
-            return summary, False
+def _describe_file(file_path: str) -> Tuple[str, str, str]:
+    file_hash = calculate_normal_hash(file_path)
+    file_name = os.path.basename(file_path)
+    file_format = os.path.splitext(file_path)[1].lower().lstrip(".")
+    return file_hash, file_name, file_format
 
-        return summary, True
 
-    except Exception as e:
-        error_message = f"Error generating summary: {str(e)}"
-        logger.error(f"{error_message}\n{traceback.format_exc()}")
-        traceback.print_exc()
-        return f"Failed to generate summary: {error_message}", False
+def _extract_summary_input(file_path: str) -> Tuple[str, str, int]:
+    max_words = int(getConfig().get("summary_in_max_words", 3000))
+    return extract_text_from_file(file_path, max_words)
 
 
-def get_article_summary(file_path: str) -> Tuple[str, bool]:
-    """Get or create a summary for an article.
+def _prefilter_summary(text: str, file_name: str) -> Optional[Tuple[str, bool]]:
+    """Return an insufficient-text result for obviously thin text, or None to
+    send it to the model."""
+    threshold = float(
+        getConfig().get("summary_prefilter_threshold", DEFAULT_PREFILTER_THRESHOLD)
+    )
+    if threshold <= 0 or not text or not text.strip():
+        return None
+    confidence, reasons = assess_text_insufficiency(text)
+    if confidence < threshold:
+        return None
+    logger.info(
+        f"Not summarizing {file_name}: text looks insufficient "
+        f"({confidence:.2f}: {', '.join(reasons)})"
+    )
+    return f"{PREFILTER_SUMMARY_PREFIX}: {'; '.join(reasons)}", False
 
-    Args:
-        file_path: Path to the article file
 
-    Returns:
-        Tuple[str, bool]: Article summary and a flag indicating if text was sufficient.
+async def get_article_summary_async(
+    engine: "llm.LLMEngine",
+    writer: "llm.ResultWriter",
+    file_path: str,
+    on_summary: Optional[Callable[[str, str, str], Awaitable[None]]] = None,
+) -> Tuple[str, bool]:
+    """Get or create a summary for an article.
+
+    Hashing, text extraction and database lookups run in worker threads, the
+    model call on the shared engine, and the summary row is queued on `writer`.
+    Each newly generated sufficient summary is also passed to the coroutine
+    on_summary(file_hash, file_name, summary).
     """
-    file_hash = calculate_normal_hash(file_path)
-    file_name = os.path.basename(file_path)
-    file_format = os.path.splitext(file_path)[1].lower().lstrip(".")
+    file_hash, file_name, file_format = await asyncio.to_thread(
+        _describe_file, file_path
+    )
+
+    existing = await asyncio.to_thread(_get_existing_summary, file_hash, file_name)
+    if existing:
+        return existing
 
-    # Only check existing summary if not forcing a new one
-    article = db.get_article_by_hash(file_hash)
-    if article and article["summary"] is not None and article["summary"] != "":
-        summary = article["summary"]
-        if summary == "failed_to_summarise":
-            logger.debug(f"Skipping file {file_name} due to previous insufficient text")
-            return summary, False
-        elif summary == "failed_to_extract":
-            logger.debug(f"Skipping file {file_name} due to previous extraction issues")
-            return summary, False
-        else:
-            # Article has a valid summary, return it
-            logger.debug(f"Using existing summary for {file_name}")
-            # db.update_article_summary(
-            #     file_hash,
-            #     file_name,
-            #     file_format,
-            #     summary,
-            #     article["extraction_method"],
-            #     article["word_count"],
-            # )
-            return summary, True
-
-    # If we get here, the article needs a summary (either no entry, empty summary, or forcing new)
     logger.debug(f"Generating new summary for: {file_name}")
 
     try:
-        config = getConfig()
-        max_words = int(config.get("summary_in_max_words", 3000))
-        text, extraction_method, word_count = extract_text_from_file(
-            file_path, max_words
-        )
-        summary, is_sufficient = summarize_with_openrouter(text)
-        logger.debug(
-            f"Summary generated for {file_name}: is_sufficient={is_sufficient}, length={len(summary)} chars"
+        text, extraction_method, word_count = await asyncio.to_thread(
+            _extract_summary_input, file_path
         )
-
-        if not is_sufficient and "[INSUFFICIENT_TEXT]" in summary:
-            db_summary = "failed_to_summarise"
-            logger.warning(
-                f"Insufficient text for file: {file_path}, marking as failed_to_summarise: {summary}"
+        summary, is_sufficient = _prefilter_summary(
+            text, file_name
+        ) or await summarize_with_openrouter_async(engine, text)
+        if summary.startswith(SUMMARY_FAILURE_PREFIX):
+            await asyncio.to_thread(
+                _record_summary_failure, file_hash, file_name, summary
             )
-        else:
-            db_summary = summary
-            logger.debug(f"Successfully created summary for file: {file_path}")
-
-        # Update the database with the new summary
-        logger.debug(f"Updating database with summary for {file_name}")
-        db.update_article_summary(
-            file_hash, file_name, file_format, db_summary, extraction_method, word_count
+            return summary, False
+        db_summary = _summary_to_store(file_path, summary, is_sufficient)
+        writer.put(
+            (file_hash, file_name, file_format, db_summary, extraction_method, word_count)
         )
+        if on_summary and is_sufficient:
+            await on_summary(file_hash, file_name, db_summary)
         return summary, is_sufficient
 
     except TextExtractionError as te:
         if not getattr(te, "already_logged", False):
             logger.error(f"Error extracting text from article: {str(te)}")
-        db.update_article_summary(
-            file_hash,
-            file_name,
-            file_format,
-            "failed_to_extract",
-            "no method worked",
-            0,
+        writer.put(
+            (file_hash, file_name, file_format, "failed_to_extract", "no method worked", 0)
         )
         return "failed_to_extract", False
 
     except Exception as e:
-        error_message = f"Error summarizing article: {str(e)}"
+        error_message = f"Error summarizing article: {type(e).__name__}: {e}"
         logger.error(error_message)
         if os.environ.get("DEBUG", "false").lower() == "true":
             logger.debug(traceback.format_exc())
+        await asyncio.to_thread(
+            _record_summary_failure, file_hash, file_name, error_message
+        )
         return f"Temporary error: {error_message}", False
 
 
-def summarize_articles(articles_path: Optional[str] = None, query: str = "*") -> None:
-    """Summarize all articles in the given path that don't have summaries yet.
-
-    Uses parallel processing to summarize multiple articles simultaneously.
-
-    Args:
-        articles_path: Path to the articles directory.
-        query: Query string to filter articles (default: "*" for all articles).
-    """
-    logger.info("====== Starting article summarization process ======")
-
+def select_articles_to_summarize(articles_path: Optional[str] = None) -> List[str]:
+    """Return paths of up to maxSummariesPerSession articles that don't have summaries yet."""
     if not articles_path:
         config = getConfig()
         articles_path = config.get("articleFileFolder", "")
         if not articles_path:
             logger.error("No articles directory specified in config or argument")
-            return
+            return []
 
     if not os.path.isabs(articles_path):
         articles_path = os.path.join(
@@ -260,12 +340,11 @@ def summarize_articles(articles_path: Optional[str] = None, query: str = "*") ->
 
     if not articles_needing_summary:
         logger.info("No articles need summarization")
-        return
+        return []
 
     articles_to_summarize = []
     config = getConfig()
     max_summaries_per_session = int(config.get("maxSummariesPerSession", 150))
-    random.shuffle(articles_needing_summary)
 
     for file_hash, file_name in articles_needing_summary:
         if len(articles_to_summarize) >= max_summaries_per_session:
@@ -281,45 +360,37 @@ def summarize_articles(articles_path: Optional[str] = None, query: str = "*") ->
             logger.warning(f"Could not find path for {file_name} in {articles_path}")
 
     logger.info(f"{len(articles_to_summarize)} articles need summarization")
-    if not articles_to_summarize:
-        logger.info("No articles to summarize")
-        return
+    return articles_to_summarize
 
-    max_workers = int(config.get("llm_api_batch_size", 4))
-    total_articles = len(articles_to_summarize)
+
+def report_summary_results(
+    article_paths: List[str], results: List[Tuple[bool, str, bool, str]]
+) -> None:
+    """Log how many summaries succeeded, were insufficient or failed."""
+    total_articles = len(article_paths)
     successful = 0
     failed = 0
     insufficient = 0
+    prefiltered = 0
     summary_word_counts = []
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_article = {
-            executor.submit(process_single_article, path): path
-            for path in articles_to_summarize
-        }
-        for future in concurrent.futures.as_completed(future_to_article):
-            article_path = future_to_article[future]
-            try:
-                success, message, is_sufficient, summary = future.result()
-                if success:
-                    if is_sufficient:
-                        logger.debug(
-                            f"Successfully summarized: {article_path} - {message}"
-                        )
-                        successful += 1
-                        word_count = len(summary.split())
-                        if word_count:
-                            summary_word_counts.append(word_count)
-                    else:
-                        insufficient += 1
-                else:
-                    logger.warning(f"Failed to summarize: {article_path} - {message}")
-                    failed += 1
-            except Exception as e:
-                logger.error(
-                    f"Failed to summarize: {article_path} - {str(e)}\n{traceback.format_exc()}"
-                )
-                failed += 1
+    for article_path, (success, message, is_sufficient, summary) in zip(
+        article_paths, results
+    ):
+        if success:
+            if is_sufficient:
+                logger.debug(f"Successfully summarized: {article_path} - {message}")
+                successful += 1
+                word_count = len(summary.split())
+                if word_count:
+                    summary_word_counts.append(word_count)
+            else:
+                insufficient += 1
+                if summary.startswith(PREFILTER_SUMMARY_PREFIX):
+                    prefiltered += 1
+        else:
+            logger.warning(f"Failed to summarize: {article_path} - {message}")
+            failed += 1
 
     if summary_word_counts:
         avg_word_count = sum(summary_word_counts) / len(summary_word_counts)
@@ -331,36 +402,99 @@ def summarize_articles(articles_path: Optional[str] = None, query: str = "*") ->
     logger.info(
         f"Summary: Processed {total_articles} articles - {successful} successful, {insufficient} insufficient text, {failed} failed"
     )
-    logger.info("====== Finished article summarization process ======")
+    if prefiltered:
+        logger.info(
+            f"Local pre-filter marked {prefiltered} articles as insufficient, saving {prefiltered} LLM calls"
+        )
 
 
-def process_single_article(article_path: str) -> Tuple[bool, str, bool, str]:
-    """Process a single article for summarization.
+def summarize_articles(articles_path: Optional[str] = None, query: str = "*") -> None:
+    """Summarize all articles in the given path that don't have summaries yet.
+
+    Requests run concurrently on a single asyncio LLM engine (see llm.py).
 
     Args:
-        article_path: Path to the article file.
+        articles_path: Path to the articles directory.
+        query: Query string to filter articles (default: "*" for all articles).
+    """
+    logger.info("====== Starting article summarization process ======")
+
+    articles_to_summarize = select_articles_to_summarize(articles_path)
+    if not articles_to_summarize:
+        logger.info("No articles to summarize")
+        return
+
+    stage_metrics = llm.StageMetrics("summarize")
+    results = asyncio.run(_summarize_paths_async(articles_to_summarize, stage_metrics))
+    report_summary_results(articles_to_summarize, results)
+    stage_metrics.log()
+    logger.info("====== Finished article summarization process ======")
+
+
+def _summary_outcome(summary: str, is_sufficient: bool) -> Tuple[bool, str, bool, str]:
+    if summary.startswith((SUMMARY_FAILURE_PREFIX, "Temporary error:")):
+        return False, summary, False, ""
+    if not is_sufficient:
+        return (
+            True,
+            f"Insufficient text detected ({len(summary)} chars)",
+            False,
+            summary,
+        )
+    return True, f"Summary generated ({len(summary)} chars)", True, summary
+
+
+async def process_single_article_async(
+    engine: "llm.LLMEngine",
+    writer: "llm.ResultWriter",
+    article_path: str,
+    on_summary: Optional[Callable[[str, str, str], Awaitable[None]]] = None,
+) -> Tuple[bool, str, bool, str]:
+    """Summarize one article.
 
     Returns:
         Tuple[bool, str, bool, str]: Success status, message, sufficiency flag, and summary.
     """
     try:
-        summary, is_sufficient = get_article_summary(article_path)
-        if summary.startswith("Failed to summarize article:"):
-            return False, summary, False, ""
-        if not is_sufficient:
-            return (
-                True,
-                f"Insufficient text detected ({len(summary)} chars)",
-                False,
-                summary,
-            )
-        return True, f"Summary generated ({len(summary)} chars)", True, summary
+        return _summary_outcome(
+            *await get_article_summary_async(engine, writer, article_path, on_summary)
+        )
     except Exception as e:
         error_message = f"Error processing article: {str(e)}"
         logger.error(f"{error_message}\n{traceback.format_exc()}")
         return False, error_message, False, ""
 
 
+async def summarize_paths_async(
+    engine: "llm.LLMEngine",
+    article_paths: List[str],
+    on_summary: Optional[Callable[[str, str, str], Awaitable[None]]] = None,
+    stage_metrics: Optional["llm.StageMetrics"] = None,
+) -> List[Tuple[bool, str, bool, str]]:
+    """Summarize article_paths concurrently on `engine`, writing summaries
+    through one writer; see get_article_summary_async for on_summary."""
+
+    async def summarize(path: str) -> Tuple[bool, str, bool, str]:
+        if stage_metrics:
+            stage_metrics.start(path)
+        outcome = await process_single_article_async(engine, writer, path, on_summary)
+        if stage_metrics:
+            stage_metrics.finish(path)
+        return outcome
+
+    async with llm.ResultWriter(db.update_article_summaries_bulk) as writer:
+        return await asyncio.gather(*(summarize(path) for path in article_paths))
+
+
+async def _summarize_paths_async(
+    article_paths: List[str], stage_metrics: Optional["llm.StageMetrics"] = None
+) -> List[Tuple[bool, str, bool, str]]:
+    async with llm.LLMEngine() as engine:
+        return await summarize_paths_async(
+            engine, article_paths, stage_metrics=stage_metrics
+        )
+
+
 def add_files_to_database(articles_path: Optional[str] = None) -> int:
     """Add all supported files to the database without summarizing.
 
@@ -379,38 +513,203 @@ def add_files_to_database(articles_path: Optional[str] = None) -> int:
 
     logger.debug(f"Adding files to database from: {articles_path}")
     db.setup_database()
-    config = getConfig()
-    file_names_to_skip = config.get("fileNamesToSkip", [])
+    file_names_to_skip = utils.getConfigStore().fileNamesToSkip
     existing_hashes = set(db.get_all_file_hashes())
     added_count = 0
     all_article_paths = getArticlePathsForQuery("*")
     logger.info(f"Found {len(all_article_paths)} files in {articles_path}.")
+    file_hashes = calculate_normal_hashes(
+        [
+            file_path
+            for file_path in all_article_paths
+            if os.path.basename(file_path) not in file_names_to_skip
+        ]
+    )
 
+    new_files = []
     for file_path in all_article_paths:
         file_name = os.path.basename(file_path)
         if file_name in file_names_to_skip:
             continue
-        try:
-            file_hash = calculate_normal_hash(file_path)
-            if file_hash in existing_hashes:
-                continue
-            file_ext = os.path.splitext(file_name)[1].lstrip(".")
-            db.add_file_to_database(file_hash, file_name, file_ext)
-            existing_hashes.add(file_hash)
-            added_count += 1
-            if added_count % 100 == 0:
-                logger.debug(f"Added {added_count} new files to database")
-        except Exception as e:
-            logger.error(f"Error adding file to database: {file_path}: {str(e)}")
-            traceback.print_exc()
+        file_hash = file_hashes.get(file_path)
+        if file_hash is None or file_hash in existing_hashes:
+            continue
+        file_ext = os.path.splitext(file_name)[1].lstrip(".")
+        new_files.append((file_hash, file_name, file_ext))
+        existing_hashes.add(file_hash)
+
+    try:
+        added_count = db.add_files_bulk(new_files)
+    except Exception as e:
+        logger.error(f"Error adding files to database: {str(e)}")
+        traceback.print_exc()
 
     logger.info(f"Added a total of {added_count} new files to database")
+    backfill_source_urls(articles_path)
     return added_count
 
 
+def backfill_source_urls(articles_path: str) -> int:
+    """Extract and cache source URLs for articles that have none cached yet.
+
+    Args:
+        articles_path: Path to the articles directory.
+
+    Returns:
+        int: Number of articles whose URL was cached.
+    """
+    source_urls = {}
+    for article_id, file_name in db.get_articles_missing_source_url():
+        file_path = os.path.join(articles_path, file_name)
+        if not os.path.exists(file_path):
+            continue
+        try:
+            source_urls[article_id] = utils.getUrlOfArticle(file_path)
+        except OSError as e:
+            logger.warning(f"Could not read URL of {file_name}: {e}")
+    db.set_source_urls(source_urls)
+    logger.debug(f"Cached source URLs for {len(source_urls)} articles")
+    return len(source_urls)
+
+
+def _remember_registry_hash_mode(mode: str) -> None:
+    """Record that the URL registries contain hashes made in this mode."""
+    modes = [m for m in (db.get_setting("registry_hash_modes") or "").split(",") if m]
+    if mode not in modes:
+        db.set_setting("registry_hash_modes", ",".join(modes + [mode]))
+
+
+def migrate_file_hashes(articles_path: Optional[str] = None) -> int:
+    """Rewrite stored article hashes when the configured fileHashMode changes.
+
+    Article rows are updated in place, so summaries and tags survive. The new
+    fingerprints of library files are also appended to the already-added and
+    marked-as-read registries. The old mode is remembered so documents that
+    have since left the library are still matched by their old hash on import.
+
+    Args:
+        articles_path: Path to the articles directory.
+
+    Returns:
+        int: Number of article hashes rewritten.
+    """
+    if not articles_path:
+        articles_path = getConfig().get("articleFileFolder", "")
+        if not articles_path:
+            logger.error("Article file folder not found in config")
+            return 0
+
+    db.setup_database()
+    mode = utils.getFileHashMode()
+    stored_mode = db.get_setting("file_hash_mode")
+    if stored_mode is None:
+        # Databases created before fingerprint modes existed hold legacy hashes
+        stored_mode = "legacy" if db.get_all_file_hashes() else mode
+        already_added = utils.getAbsPath("../storage/alreadyAddedArticles.txt")
+        if os.path.exists(already_added) and os.path.getsize(already_added):
+            # So do registries written before then, even without a database
+            _remember_registry_hash_mode("legacy")
+    if stored_mode == mode:
+        db.set_setting("file_hash_mode", mode)
+        return 0
+
+    logger.info(f"Migrating article hashes from '{stored_mode}' to '{mode}'")
+    # Documents no longer in the library are only known by their old hash
+    _remember_registry_hash_mode(stored_mode)
+    articles = db.get_all_article_file_names()
+    paths_by_id = {
+        article_id: os.path.join(articles_path, file_name)
+        for article_id, file_name, _ in articles
+        if os.path.exists(os.path.join(articles_path, file_name))
+    }
+    hashes_by_path = calculate_normal_hashes(list(paths_by_id.values()), mode)
+    new_hashes = {
+        article_id: hashes_by_path[file_path]
+        for article_id, file_path in paths_by_id.items()
+        if file_path in hashes_by_path
+    }
+    rewritten, collisions = db.rewrite_file_hashes(new_hashes)
+
+    library_paths = getArticlePathsForQuery("*")
+    library_hashes = calculate_normal_hashes(library_paths, mode)
+    utils.addUrlToUrlFile(
+        list(library_hashes.values()),
+        utils.getAbsPath("../storage/alreadyAddedArticles.txt"),
+    )
+    read_hashes = [
+        file_hash
+        for file_path, file_hash in library_hashes.items()
+        if os.path.basename(file_path).startswith(".")
+    ]
+    if read_hashes:
+        utils.addUrlToUrlFile(
+            read_hashes, utils.getAbsPath("../storage/markedAsReadArticles.txt")
+        )
+
+    db.set_setting("file_hash_mode", mode)
+    logger.info(
+        f"Rewrote {rewritten} article hashes ({collisions} kept due to collisions)"
+    )
+    return rewritten
+
+
+def reconcile_renamed_files(
+    articles_path: str, existing_paths: Optional[List[str]] = None
+) -> int:
+    """Move article rows whose file vanished onto a new file with the same hash.
+
+    Hiding an article as read (x.html -> .x.html), retitling or moving a file
+    changes its name but not its content, so matching vanished rows to
+    unknown files by hash keeps the summary and tags instead of deleting the
+    row and paying for them again.
+
+    Args:
+        articles_path: Path to the articles directory.
+        existing_paths: Article paths currently on disk (looked up if not given).
+
+    Returns:
+        int: Number of articles renamed in the database.
+    """
+    if existing_paths is None:
+        existing_paths = getArticlePathsForQuery("*")
+    paths_by_name = {os.path.basename(path): path for path in existing_paths}
+    vanished_by_hash = {}
+    known_names = set()
+    for article_id, file_name, file_hash in db.get_all_article_file_names():
+        known_names.add(file_name)
+        if file_name not in paths_by_name and file_hash:
+            vanished_by_hash[file_hash] = (article_id, file_name)
+    if not vanished_by_hash:
+        return 0
+
+    file_names_to_skip = utils.getConfigStore().fileNamesToSkip
+    unknown_paths = [
+        path
+        for name, path in paths_by_name.items()
+        if name not in known_names and name not in file_names_to_skip
+    ]
+    renames = {}
+    for file_path, file_hash in calculate_normal_hashes(unknown_paths).items():
+        match = vanished_by_hash.pop(file_hash, None)
+        if match is None:
+            continue
+        article_id, old_name = match
+        new_name = os.path.basename(file_path)
+        renames[article_id] = (new_name, os.path.splitext(new_name)[1].lstrip("."))
+        logger.debug(f"Article renamed: {old_name} -> {new_name}")
+
+    renamed_count = db.rename_articles(renames)
+    if renamed_count:
+        logger.info(f"Kept {renamed_count} renamed articles by matching content hashes")
+    return renamed_count
+
+
 def remove_nonexistent_files_from_database(articles_path: Optional[str] = None) -> int:
     """Remove database entries for files that no longer exist on the filesystem.
 
+    Renamed files are reconciled first (see reconcile_renamed_files), so only
+    rows whose content is gone from the library are deleted.
+
     Args:
         articles_path: Path to the articles directory.
 
@@ -425,7 +724,9 @@ def remove_nonexistent_files_from_database(articles_path: Optional[str] = None)
             return 0
 
     logger.debug(f"Checking for nonexistent files in database from: {articles_path}")
-    existing_files = {os.path.basename(path) for path in getArticlePathsForQuery("*")}
+    existing_paths = getArticlePathsForQuery("*")
+    reconcile_renamed_files(articles_path, existing_paths)
+    existing_files = {os.path.basename(path) for path in existing_paths}
     removed_count = db.remove_nonexistent_files(existing_files)
     if removed_count > 0:
         logger.info(
@@ -1,21 +1,29 @@
 import os
 import sys
 import json
+import time
 import traceback
 import argparse
-import concurrent.futures
+import asyncio
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Tuple, Set, Optional
+from typing import Callable, Dict, Iterable, List, Tuple, Set, Optional
 from loguru import logger
 from dotenv import load_dotenv
-from openai import OpenAI
 from .utils import getConfig
 from . import db
 from . import textExtraction
 from . import utils
+from . import llm
+from . import articleSummary
 
 # Constants
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
+ARTICLE_TEXT_LIMIT = 6000  # characters of article text sent per tag evaluation
+TAG_PROMPT_VERSION = 1  # bump when tag prompts change to stop reusing cached verdicts
+WORK_UNIT_QUEUE_SIZE = 64  # prepared work units waiting for the LLM, bounds memory
+PACK_LINGER_SECONDS = 0.5  # longest a partial pack waits for more articles
+DEFAULT_EXTRACTION_WORKERS = 4
 LOG_DIR = PROJECT_ROOT / "logs"
 LOG_FILE_PATH = LOG_DIR / "tagging.log"
 
@@ -67,35 +75,17 @@ class TagEvaluator:
     def __init__(self):
         self.config = getConfig()
         self.model = self.config.get("ai_model", "google/gemini-2.0-flash-001")
-        self.batch_size = int(self.config.get("tag_batch_size", 3))
+        # Tags judged per request; 1 sends one request per tag
+        self.batch_size = int(self.config.get("tag_batch_size", 20))
+        # Article text (in estimated tokens) packed into one request; 0 disables packing
+        self.pack_token_budget = int(self.config.get("tag_pack_token_budget", 8000))
+        self.pack_max_articles = int(self.config.get("tag_pack_max_articles", 16))
         logger.info(f"Tag batch size set to {self.batch_size}")
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        if not self.api_key:
-            logger.error("OPENROUTER_API_KEY not found in environment variables")
-            raise ValueError("OPENROUTER_API_KEY not found in environment variables")
-
-    def _create_openai_client(self) -> OpenAI:
-        return OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
-
-    def evaluate_tags(self, text: str, tags_to_evaluate: List) -> Dict[int, bool]:
-        if not text or not text.strip():
-            logger.warning("No text to evaluate for tags")
-            return {tag["id"]: False for tag in tags_to_evaluate}
-        if not tags_to_evaluate:
-            return {}
-
-        # Assume tags_to_evaluate has only a single element
-        tag = tags_to_evaluate[0]
-        client = self._create_openai_client()
 
+    def _build_tag_prompts(self, text: str, tag: Dict) -> Tuple[str, str]:
         # Only include the description in the prompt, with no mention of tag name
         tag_description = tag["description"]
 
-        logger.debug(f"Evaluating article for a single tag using model: {self.model}")
-
         system_prompt = (
             "Your task is to determine if the article summary matches the provided description."
             "Interpret the description literally. You must respond in valid JSON format only."
@@ -107,57 +97,188 @@ class TagEvaluator:
         user_prompt = (
             f"Please analyze the following article summary to determine if it matches the description provided below. The purpose is to decide whether to add the article to a reading list which should only contain articles which match the description.\n\n"
             f"Interpret the reading list description literally. Only return true if it accurately describes the article summary.\n\nDescription: {tag_description}\n\n"
-            f"Article summary:\n{text[:6000]}\n\n"
+            f"Article summary:\n{text[:ARTICLE_TEXT_LIMIT]}\n\n"
             f"Based on the description, state if this article summary satisfies the description.\n\n"
             f"Your response must be valid JSON in this exact format:\n{json_format_example}"
         )
+        return system_prompt, user_prompt
+
+    @staticmethod
+    def _json_retry_prompt(user_prompt: str, error: json.JSONDecodeError) -> str:
+        return (
+            f"The previous response couldn't be parsed as valid JSON. The error was: {error}\n\n{user_prompt}\n\n"
+            "IMPORTANT: YOU MUST RETURN ONLY VALID JSON. No explanations or additional text."
+        )
+
+    def _build_multi_tag_prompts(self, text: str, tags: List[Dict]) -> Tuple[str, str]:
+        system_prompt = (
+            "Your task is to determine, for each of several descriptions, whether the article summary matches it. "
+            "Interpret each description literally and judge it independently of the others. "
+            "You must respond in valid JSON format only."
+        )
+
+        descriptions = "\n".join(f'- "{tag["id"]}": {tag["description"]}' for tag in tags)
+        json_format_example = (
+            "{" + ", ".join(f'"{tag["id"]}": true or false' for tag in tags) + "}"
+        )
+
+        user_prompt = (
+            f"Please analyze the following article summary to determine which of the descriptions provided below it matches. The purpose is to decide which reading lists to add the article to; each reading list should only contain articles which match its description.\n\n"
+            f"Interpret each reading list description literally. Only return true for a description if it accurately describes the article summary.\n\nDescriptions (keyed by id):\n{descriptions}\n\n"
+            f"Article summary:\n{text[:ARTICLE_TEXT_LIMIT]}\n\n"
+            f"Based on the descriptions, state for each id whether this article summary satisfies that description.\n\n"
+            f"Your response must be valid JSON in this exact format:\n{json_format_example}"
+        )
+        return system_prompt, user_prompt
+
+    @staticmethod
+    def _multi_tag_response_format(tags: List[Dict]) -> Dict:
+        """JSON schema requiring exactly one boolean per tag id."""
+        tag_keys = [str(tag["id"]) for tag in tags]
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "tag_verdicts",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {key: {"type": "boolean"} for key in tag_keys},
+                    "required": tag_keys,
+                    "additionalProperties": False,
+                },
+            },
+        }
+
+    @staticmethod
+    def _parse_multi_tag_response(
+        result_text: str, tags: List[Dict]
+    ) -> Tuple[Dict[int, bool], List[Dict]]:
+        """Split a multi-tag response into valid verdicts and tags needing a retry."""
+        try:
+            result_json = json.loads(result_text.strip())
+        except (json.JSONDecodeError, AttributeError):
+            return {}, list(tags)
+        return TagEvaluator._validate_tag_verdicts(result_json, tags)
+
+    @staticmethod
+    def _validate_tag_verdicts(
+        result_json, tags: List[Dict]
+    ) -> Tuple[Dict[int, bool], List[Dict]]:
+        if not isinstance(result_json, dict):
+            return {}, list(tags)
+        verdicts = {}
+        invalid_tags = []
+        for tag in tags:
+            value = result_json.get(str(tag["id"]))
+            if isinstance(value, bool):
+                verdicts[tag["id"]] = value
+            else:
+                invalid_tags.append(tag)
+        return verdicts, invalid_tags
+
+    async def evaluate_tags_async(
+        self, engine: llm.LLMEngine, text: str, tags_to_evaluate: List
+    ) -> Dict[int, bool]:
+        """Evaluate tags on a shared engine.
+
+        Several tags are judged in one request whose structured response holds
+        a boolean per tag id; tags missing or malformed in that response fall
+        back to single-tag requests.
+        """
+        if not text or not text.strip():
+            logger.warning("No text to evaluate for tags")
+            return {tag["id"]: False for tag in tags_to_evaluate}
+        if not tags_to_evaluate:
+            return {}
+        if len(tags_to_evaluate) == 1:
+            return await self._evaluate_single_tag_async(
+                engine, text, tags_to_evaluate[0]
+            )
+
+        logger.debug(
+            f"Evaluating article for {len(tags_to_evaluate)} tags in one request using model: {self.model}"
+        )
+        system_prompt, user_prompt = self._build_multi_tag_prompts(
+            text, tags_to_evaluate
+        )
+        try:
+            result_text = await engine.complete(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                cache_version=TAG_PROMPT_VERSION,
+                cacheable=_is_json_object,
+                response_format=self._multi_tag_response_format(tags_to_evaluate),
+            )
+        except Exception as e:
+            # No verdicts, so the tags are evaluated again in a later session
+            logger.error(f"Error evaluating tags: {e}\n{traceback.format_exc()}")
+            return {}
+
+        verdicts, invalid_tags = self._parse_multi_tag_response(
+            result_text, tags_to_evaluate
+        )
+        if invalid_tags:
+            logger.warning(
+                f"Multi-tag response had no valid verdict for {len(invalid_tags)} of {len(tags_to_evaluate)} tags, "
+                f"evaluating them individually. Response: {result_text}"
+            )
+            fallback_results = await engine.map(
+                lambda tag: self._evaluate_single_tag_async(engine, text, tag),
+                invalid_tags,
+            )
+            for result in fallback_results:
+                if not isinstance(result, Exception):
+                    verdicts.update(result)
+        return verdicts
+
+    async def _evaluate_single_tag_async(
+        self, engine: llm.LLMEngine, text: str, tag: Dict
+    ) -> Dict[int, bool]:
+        system_prompt, user_prompt = self._build_tag_prompts(text, tag)
 
         max_retries = 3
         retry_count = 0
         while retry_count < max_retries:
+            result_text = ""
             try:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
+                result_text = await engine.complete(
+                    [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": user_prompt},
                     ],
+                    cache_version=TAG_PROMPT_VERSION,
+                    cacheable=_is_json_object,
                     response_format={"type": "json_object"},
                 )
-                result_text = response.choices[0].message.content.strip()
-                result_json = json.loads(result_text)
-
-                # Map the result to the tag ID
-                match_result = result_json.get("matches", False)
-                results = {tag["id"]: match_result}
-
+                result_json = json.loads(result_text.strip())
+                match_result = (
+                    result_json.get("matches") if isinstance(result_json, dict) else None
+                )
+                if not isinstance(match_result, bool):
+                    # Only a JSON boolean is a verdict, as in _validate_tag_verdicts;
+                    # anything else leaves the tag for a later session
+                    logger.warning(f"Tag response had no valid verdict: {result_text}")
+                    return {}
                 logger.debug(f"Tag evaluation result: {match_result}")
-
-                if tag["id"] == 487 and match_result == True:
-                    logger.info("\n\n\n", user_prompt, results)
-
-                return results
+                return {tag["id"]: match_result}
             except json.JSONDecodeError as e:
                 retry_count += 1
                 logger.warning(
                     f"Attempt {retry_count}: Failed to parse JSON response: {result_text}"
                 )
                 if retry_count >= max_retries:
+                    # Not a verdict, so the tag is evaluated again in a later session
                     logger.error(f"All {max_retries} attempts failed. Last error: {e}")
-                    return {tag["id"]: False}
-                user_prompt = (
-                    f"The previous response couldn't be parsed as valid JSON. The error was: {e}\n\n{user_prompt}\n\n"
-                    "IMPORTANT: YOU MUST RETURN ONLY VALID JSON. No explanations or additional text."
-                )
+                    return {}
+                user_prompt = self._json_retry_prompt(user_prompt, e)
             except Exception as e:
+                # No verdict, so the tag is evaluated again in a later session
                 logger.error(f"Error evaluating tags: {e}\n{traceback.format_exc()}")
-                return {tag["id"]: False}
+                return {}
 
-    def batch_evaluate_tags(
-        self, article_id: int, file_name: str, text: str, tags_to_evaluate: List
-    ) -> Dict[int, bool]:
-        if not tags_to_evaluate or not text:
-            return {}
+    def _split_into_batches(self, tags_to_evaluate: List) -> List[List]:
         tag_batches = [
             tags_to_evaluate[i : i + self.batch_size]
             for i in range(0, len(tags_to_evaluate), self.batch_size)
@@ -165,20 +286,330 @@ class TagEvaluator:
         logger.debug(
             f"Processing {len(tags_to_evaluate)} tags in {len(tag_batches)} batches (batch size: {self.batch_size})"
         )
+        return tag_batches
+
+    async def batch_evaluate_tags_async(
+        self,
+        engine: llm.LLMEngine,
+        article_id: int,
+        file_name: str,
+        text: str,
+        tags_to_evaluate: List,
+    ) -> Dict[int, bool]:
+        """Evaluate all tag batches of one article concurrently."""
+        if not tags_to_evaluate or not text:
+            return {}
+        tag_batches = self._split_into_batches(tags_to_evaluate)
+        batch_results = await engine.map(
+            lambda batch: self.evaluate_tags_async(engine, text, batch), tag_batches
+        )
         tag_results = {}
-        for i, batch in enumerate(tag_batches):
-            try:
-                batch_tag_names = [tag["name"] for tag in batch]
-                logger.debug(
-                    f"Batch {i+1}/{len(tag_batches)}: Evaluating tags {', '.join(batch_tag_names)}"
-                )
-                batch_results = self.evaluate_tags(text, batch)
-                tag_results.update(batch_results)
-                logger.debug(f"Batch {i+1}/{len(tag_batches)}: Completed evaluation")
-            except Exception as e:
-                logger.error(f"Error processing batch {i+1}: {e}")
+        for i, result in enumerate(batch_results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing batch {i+1}: {result}")
+                continue
+            tag_results.update(result)
         return tag_results
 
+    def _build_packed_prompts(
+        self, articles: List[Tuple[int, str]], tags: List[Dict]
+    ) -> Tuple[str, str]:
+        system_prompt = (
+            "Your task is to determine, for each of several article summaries and each of several descriptions, "
+            "whether the summary matches the description. Interpret each description literally and judge every "
+            "article independently of the others. You must respond in valid JSON format only."
+        )
+
+        descriptions = "\n".join(f'- "{tag["id"]}": {tag["description"]}' for tag in tags)
+        summaries = "\n\n".join(
+            f'### Article "{_article_key(article_id)}"\n{text[:ARTICLE_TEXT_LIMIT]}'
+            for article_id, text in articles
+        )
+        tag_format = "{" + ", ".join(f'"{tag["id"]}": true or false' for tag in tags) + "}"
+        json_format_example = (
+            "{"
+            + ", ".join(f'"{_article_key(article_id)}": {tag_format}' for article_id, _ in articles)
+            + "}"
+        )
+
+        user_prompt = (
+            f"Please analyze each of the following article summaries to determine which of the descriptions provided below it matches. The purpose is to decide which reading lists to add each article to; each reading list should only contain articles which match its description.\n\n"
+            f"Interpret each reading list description literally. Only return true for a description if it accurately describes that article's summary.\n\nDescriptions (keyed by id):\n{descriptions}\n\n"
+            f"Article summaries (keyed by article id):\n\n{summaries}\n\n"
+            f"Based on the descriptions, state for each article and each description id whether the article summary satisfies that description.\n\n"
+            f"Your response must be valid JSON in this exact format:\n{json_format_example}"
+        )
+        return system_prompt, user_prompt
+
+    @staticmethod
+    def _packed_response_format(
+        articles: List[Tuple[int, str]], tags: List[Dict]
+    ) -> Dict:
+        """JSON schema requiring one boolean per tag id for every article."""
+        tag_keys = [str(tag["id"]) for tag in tags]
+        article_keys = [_article_key(article_id) for article_id, _ in articles]
+        verdicts_schema = {
+            "type": "object",
+            "properties": {key: {"type": "boolean"} for key in tag_keys},
+            "required": tag_keys,
+            "additionalProperties": False,
+        }
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "packed_tag_verdicts",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {key: verdicts_schema for key in article_keys},
+                    "required": article_keys,
+                    "additionalProperties": False,
+                },
+            },
+        }
+
+    async def evaluate_packed_async(
+        self, engine: llm.LLMEngine, articles: List[Tuple[int, str]], tags: List[Dict]
+    ) -> Dict[int, Dict[int, bool]]:
+        """Evaluate the same tags for several (article_id, text) pairs in one request.
+
+        Articles whose verdicts are missing or malformed in the packed response
+        are evaluated again without packing.
+        """
+        system_prompt, user_prompt = self._build_packed_prompts(articles, tags)
+        try:
+            result_text = await engine.complete(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                cache_version=TAG_PROMPT_VERSION,
+                cacheable=_is_json_object,
+                response_format=self._packed_response_format(articles, tags),
+            )
+        except Exception as e:
+            # No verdicts, so the articles are evaluated again in a later session
+            logger.error(f"Error evaluating packed articles: {e}\n{traceback.format_exc()}")
+            return {}
+
+        try:
+            result_json = json.loads(result_text.strip())
+        except (json.JSONDecodeError, AttributeError):
+            result_json = {}
+        if not isinstance(result_json, dict):
+            result_json = {}
+
+        results = {}
+        unpacked = []
+        for article_id, text in articles:
+            verdicts, invalid_tags = self._validate_tag_verdicts(
+                result_json.get(_article_key(article_id)), tags
+            )
+            results[article_id] = verdicts
+            if invalid_tags:
+                unpacked.append((article_id, text, invalid_tags))
+        if unpacked:
+            logger.warning(
+                f"Packed response had incomplete verdicts for {len(unpacked)} of {len(articles)} articles, "
+                f"evaluating them individually"
+            )
+            fallback_results = await engine.map(
+                lambda item: self.evaluate_tags_async(engine, item[1], item[2]),
+                unpacked,
+            )
+            for (article_id, _, _), result in zip(unpacked, fallback_results):
+                if not isinstance(result, Exception):
+                    results[article_id].update(result)
+        return results
+
+    def _pack_work_units(self, work_units: List[Dict]) -> List[List[Dict]]:
+        """Group work units that share a tag batch into packs under the token budget."""
+        packer = _WorkUnitPacker(self)
+        packs = []
+        for unit in work_units:
+            packs.extend(packer.add(unit))
+        packs.extend(packer.drain())
+        return packs
+
+    async def _evaluate_pack_async(
+        self,
+        engine: llm.LLMEngine,
+        pack: List[Dict],
+        on_verdicts: Callable[[int, Dict[int, bool]], None],
+    ) -> None:
+        tags = pack[0]["tags"]
+        if len(pack) == 1 or self.pack_token_budget <= 0:
+            results = await engine.map(
+                lambda unit: self.evaluate_tags_async(engine, unit["text"], tags),
+                pack,
+            )
+            for unit, verdicts in zip(pack, results):
+                if isinstance(verdicts, Exception):
+                    logger.error(f"Error evaluating article {unit['file_name']}: {verdicts}")
+                    continue
+                on_verdicts(unit["article_id"], verdicts)
+            return
+        results = await self.evaluate_packed_async(
+            engine, [(unit["article_id"], unit["text"]) for unit in pack], tags
+        )
+        for article_id, verdicts in results.items():
+            on_verdicts(article_id, verdicts)
+
+    async def evaluate_work_unit_stream_async(
+        self,
+        engine: llm.LLMEngine,
+        work_units: asyncio.Queue,
+        on_verdicts: Callable[[int, Dict[int, bool]], None],
+    ) -> Tuple[int, int]:
+        """Evaluate work units as they are queued, until a None sentinel, calling
+        on_verdicts(article_id, verdicts) as results arrive.
+
+        Short articles that share a tag batch are packed into one request; a
+        pack is sent as soon as it is full, or once it has waited
+        PACK_LINGER_SECONDS for more articles. No more packs are pending than the engine's
+        current concurrency limit, so a slow or throttled API pushes back on
+        the producer instead of letting work pile up in memory.
+
+        Returns:
+            Tuple[int, int]: Number of work units evaluated and requests (packs) started
+        """
+        packer = _WorkUnitPacker(self)
+        pending = set()
+        unit_count = 0
+        started = 0
+
+        async def dispatch(pack: List[Dict]) -> None:
+            nonlocal pending, started
+            while len(pending) >= max(1, int(engine.limiter.limit)):
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    try:
+                        task.result()
+                    except Exception as e:
+                        logger.error(f"Error evaluating packed articles: {e}")
+            pending.add(
+                asyncio.create_task(self._evaluate_pack_async(engine, pack, on_verdicts))
+            )
+            started += 1
+
+        while True:
+            for pack in packer.drain(older_than=PACK_LINGER_SECONDS):
+                await dispatch(pack)
+            wait = packer.seconds_until_due(PACK_LINGER_SECONDS)
+            try:
+                if wait is None:
+                    unit = await work_units.get()
+                else:
+                    unit = await asyncio.wait_for(work_units.get(), wait)
+            except asyncio.TimeoutError:
+                continue
+            if unit is None:
+                break
+            unit_count += 1
+            for pack in packer.add(unit):
+                await dispatch(pack)
+        for pack in packer.drain():
+            await dispatch(pack)
+
+        outcomes = await asyncio.gather(*pending, return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"Error evaluating packed articles: {outcome}")
+        return unit_count, started
+
+    async def evaluate_work_units_async(
+        self,
+        engine: llm.LLMEngine,
+        work_units: Iterable[Dict],
+        on_verdicts: Callable[[int, Dict[int, bool]], None],
+    ) -> None:
+        """Evaluate already prepared work units; see evaluate_work_unit_stream_async."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for unit in work_units:
+            queue.put_nowait(unit)
+        queue.put_nowait(None)
+        unit_count, requests = await self.evaluate_work_unit_stream_async(
+            engine, queue, on_verdicts
+        )
+        logger.info(f"Evaluated {unit_count} work units in {requests} requests")
+
+
+class _WorkUnitPacker:
+    """Incrementally group work units that share a tag batch into packs.
+
+    add() returns the packs a unit completed, drain() the partial packs left
+    at the end, so only one open pack per tag batch is ever held.
+    """
+
+    def __init__(self, evaluator: TagEvaluator):
+        self.evaluator = evaluator
+        # Tag batch key -> (pack, estimated tokens, time the pack was opened)
+        self._open: Dict[Tuple[int, ...], Tuple[List[Dict], int, float]] = {}
+
+    def add(self, unit: Dict) -> List[List[Dict]]:
+        if not unit["text"]:
+            return []
+        full = []
+        for tags_batch in self.evaluator._split_into_batches(unit["tags"]):
+            key = tuple(tag["id"] for tag in tags_batch)
+            tokens = _estimate_tokens(unit["text"][:ARTICLE_TEXT_LIMIT])
+            pack, pack_tokens, opened_at = self._open.get(key, ([], 0, 0.0))
+            if pack and (
+                pack_tokens + tokens > self.evaluator.pack_token_budget
+                or len(pack) >= self.evaluator.pack_max_articles
+            ):
+                full.append(pack)
+                pack, pack_tokens = [], 0
+            if not pack:
+                opened_at = time.monotonic()
+            pack.append(dict(unit, tags=tags_batch))
+            pack_tokens += tokens
+            if (
+                pack_tokens >= self.evaluator.pack_token_budget
+                or len(pack) >= self.evaluator.pack_max_articles
+            ):
+                # Nothing more fits, so send it now rather than on the next unit
+                full.append(pack)
+                pack, pack_tokens = [], 0
+            self._open[key] = (pack, pack_tokens, opened_at)
+        return full
+
+    def seconds_until_due(self, linger: float) -> Optional[float]:
+        """Time until the oldest open pack has waited `linger` seconds, or None."""
+        opened = [opened_at for pack, _, opened_at in self._open.values() if pack]
+        if not opened:
+            return None
+        return max(0.0, min(opened) + linger - time.monotonic())
+
+    def drain(self, older_than: Optional[float] = None) -> List[List[Dict]]:
+        """Remove and return open packs, or only those opened over older_than seconds ago."""
+        now = time.monotonic()
+        packs = []
+        for key, (pack, _, opened_at) in list(self._open.items()):
+            if pack and (older_than is None or now - opened_at >= older_than):
+                packs.append(pack)
+                del self._open[key]
+        return packs
+
+
+def _article_key(article_id: int) -> str:
+    return f"article_{article_id}"
+
+
+def _is_json_object(text: str) -> bool:
+    """Whether a response parses as a JSON object, i.e. is worth caching."""
+    try:
+        return isinstance(json.loads(text.strip()), dict)
+    except (json.JSONDecodeError, AttributeError):
+        return False
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English prose
+    return len(text) // 4 + 1
+
 
 class ArticleTagger:
     """Manage applying tags to articles using parallel processing and AI evaluation."""
@@ -189,7 +620,6 @@ class ArticleTagger:
         self.max_articles_per_session = int(
             self.config.get("maxArticlesToTagPerSession", 100)
         )
-        self.max_tagging_threads = int(self.config.get("llm_api_batch_size", 4))
         self.tag_evaluator = TagEvaluator()
         self.tag_article_match_cache = {}
         self.tag_details_cache = {}
@@ -216,6 +646,7 @@ class ArticleTagger:
         
         # Initialize variables for article collection
         collected_articles = []
+        seen_article_ids = set()
         current_limit = self.max_articles_per_session
         
         # Keep fetching articles until we have enough taggable ones or no more are available
@@ -231,9 +662,10 @@ class ArticleTagger:
             for article in batch_articles:
                 article_id, file_hash, file_name, text = article
                 
-                # Skip articles we've already collected
-                if any(a[0] == article_id for a in collected_articles):
+                # Skip articles we've already looked at
+                if article_id in seen_article_ids:
                     continue
+                seen_article_ids.add(article_id)
                 
                 # Check if this article can be tagged with at least one active tag
                 is_taggable = False
@@ -318,8 +750,13 @@ class ArticleTagger:
                     all_tags=tag.get("all_tags"),
                     not_any_tags=tag.get("not_any_tags"),
                 )
-                logger.info("Tag", tag["name"], "has", len(articlesMatchingTag), "potential articles")
-                self.tag_article_match_cache[tag["id"]] = [os.path.basename(fileName).lower() for fileName in articlesMatchingTag]
+                logger.info(
+                    f"Tag {tag['name']} has {len(articlesMatchingTag)} potential articles"
+                )
+                # A set, since every article is looked up once per tag
+                self.tag_article_match_cache[tag["id"]] = {
+                    os.path.basename(fileName).lower() for fileName in articlesMatchingTag
+                }
 
     def _prepare_article_work_units(
         self, article: Tuple[int, str, str, str], active_tag_ids: Set[int]
@@ -373,74 +810,137 @@ class ArticleTagger:
 
         return work_units
 
-    def _process_article_tag_batch(
-        self, article_id: int, file_name: str, text: str, tags_batch: List
-    ) -> Dict[int, bool]:
-        """Process a batch of tags for an article."""
-        logger.debug(f"Evaluating article {file_name} with {len(tags_batch)} tags")
-        try:
-            return self.tag_evaluator.batch_evaluate_tags(
-                article_id, file_name, text, tags_batch
-            )
-        except Exception as e:
-            logger.error(f"Error evaluating article {file_name}: {e}")
-            logger.error(traceback.format_exc())
-            return {}
+    async def _produce_work_units(
+        self,
+        article_queue: asyncio.Queue,
+        active_tag_ids: Set[int],
+        queue: asyncio.Queue,
+        stage_metrics: Optional[llm.StageMetrics] = None,
+    ) -> None:
+        """Prepare work units for queued articles on a pool of extraction workers.
 
-    def _process_work_units(self, work_units: List[Dict]) -> Dict[int, Dict]:
-        """Process all work units in parallel using a ThreadPoolExecutor."""
-        if not work_units:
-            logger.debug("No work units to process")
-            return {}
-        logger.info(f"Processing {len(work_units)} work units in parallel")
-        results_by_article = {}
-        file_names_by_article = {}
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_tagging_threads
-        ) as executor:
-            futures = {}
-            for unit in work_units:
-                article_id = unit["article_id"]
-                file_name = unit["file_name"]
-                file_names_by_article[article_id] = file_name
-                text = unit["text"]
-                future = executor.submit(
-                    self._process_article_tag_batch,
-                    article_id,
-                    file_name,
-                    text,
-                    unit["tags"],
-                )
-                futures[future] = article_id
-            for future in concurrent.futures.as_completed(futures):
-                article_id = futures[future]
+        Articles are taken from article_queue until a None sentinel. queue.put()
+        blocks while the work unit queue is full, so extraction never runs more
+        than WORK_UNIT_QUEUE_SIZE units ahead of the LLM workers.
+        """
+        workers = max(
+            1, int(self.config.get("tag_extraction_workers", DEFAULT_EXTRACTION_WORKERS))
+        )
+
+        async def extraction_worker() -> None:
+            while True:
+                article = await article_queue.get()
+                if article is None:
+                    # Leave the sentinel for the other workers
+                    article_queue.put_nowait(None)
+                    return
+                if stage_metrics:
+                    stage_metrics.start(article[0])
                 try:
-                    batch_results = future.result()
-                    if article_id not in results_by_article:
-                        results_by_article[article_id] = {
-                            "matches": {},
-                            "non_matches": {},
-                        }
-                    for tag_id, matched in batch_results.items():
-                        if matched:
-                            results_by_article[article_id]["matches"][tag_id] = True
-                        else:
-                            results_by_article[article_id]["non_matches"][tag_id] = True
+                    work_units = await asyncio.to_thread(
+                        self._prepare_article_work_units, article, active_tag_ids
+                    )
                 except Exception as e:
-                    logger.error(
-                        f"Error processing article {article_id}: {e}\n{traceback.format_exc()}"
+                    logger.error(f"Error preparing article {article[2]}: {e}")
+                    work_units = []
+                if stage_metrics and not any(unit["text"] for unit in work_units):
+                    # Nothing goes to the LLM, so no verdict callback finishes it
+                    stage_metrics.finish(article[0])
+                for unit in work_units:
+                    await queue.put(unit)
+
+        await asyncio.gather(*(extraction_worker() for _ in range(workers)))
+
+    async def tag_article_stream_async(
+        self,
+        engine: llm.LLMEngine,
+        article_queue: asyncio.Queue,
+        active_tag_ids: Set[int],
+        stage_metrics: Optional[llm.StageMetrics] = None,
+    ) -> Dict[int, int]:
+        """Extract, evaluate and store tags for articles as one streaming pipeline.
+
+        Articles, as (id, file_hash, file_name, summary) tuples, are read from
+        article_queue until a None sentinel, so they can be added while the
+        session runs. Extraction workers feed a bounded queue that the LLM
+        engine drains, so the first request goes out as soon as the first
+        article is prepared and memory stays constant however large the
+        session is. Verdicts are written to the database in small batches as
+        they arrive, through a single writer, so an interrupted session keeps
+        its completed work and the next one only evaluates what is still
+        missing. Only the number of matches per tag is kept in memory.
+
+        Returns:
+            Dict[int, int]: Number of matching articles per tag id
+        """
+        match_counts = defaultdict(int)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WORK_UNIT_QUEUE_SIZE)
+
+        def record_verdicts(article_id: int, verdicts: Dict[int, bool]) -> None:
+            for tag_id, matched in verdicts.items():
+                if matched:
+                    match_counts[tag_id] += 1
+                writer.put((article_id, tag_id, bool(matched)))
+            if stage_metrics:
+                stage_metrics.finish(article_id)
+
+        async def produce() -> None:
+            try:
+                await self._produce_work_units(
+                    article_queue, active_tag_ids, queue, stage_metrics
+                )
+            finally:
+                await queue.put(None)
+
+        async with llm.ResultWriter(db.set_article_tags_bulk) as writer:
+            producer = asyncio.create_task(produce())
+            try:
+                unit_count, requests = (
+                    await self.tag_evaluator.evaluate_work_unit_stream_async(
+                        engine, queue, record_verdicts
                     )
-        return results_by_article
+                )
+            finally:
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+        logger.info(
+            f"Evaluated {unit_count} work units in {requests} requests, "
+            f"stored {writer.rows_written} tag verdicts"
+        )
+        return dict(match_counts)
+
+    async def _process_articles_async(
+        self,
+        articles: List[Tuple[int, str, str, str]],
+        active_tag_ids: Set[int],
+        stage_metrics: Optional[llm.StageMetrics] = None,
+    ) -> Dict[int, int]:
+        article_queue: asyncio.Queue = asyncio.Queue()
+        for article in articles:
+            article_queue.put_nowait(article)
+        article_queue.put_nowait(None)
+        async with llm.LLMEngine() as engine:
+            return await self.tag_article_stream_async(
+                engine, article_queue, active_tag_ids, stage_metrics
+            )
 
-    def _apply_tag_results_to_articles(
-        self, results_by_article: Dict[int, Dict]
-    ) -> None:
-        """Apply tag evaluation results to articles in the database."""
-        for article_id, results in results_by_article.items():
-            for tag_id in results.get("matches", {}):
-                db.set_article_tag(article_id, tag_id, True)
-            for tag_id in results.get("non_matches", {}):
-                db.set_article_tag(article_id, tag_id, False)
+    def _process_articles(
+        self, articles: List[Tuple[int, str, str, str]], active_tag_ids: Set[int]
+    ) -> Dict[int, int]:
+        """Tag articles concurrently and store their verdicts.
+
+        Returns:
+            Dict[int, int]: Number of matching articles per tag id
+        """
+        if not articles:
+            logger.debug("No articles to process")
+            return {}
+        stage_metrics = llm.StageMetrics("tag")
+        match_counts = asyncio.run(
+            self._process_articles_async(articles, active_tag_ids, stage_metrics)
+        )
+        stage_metrics.log()
+        return match_counts
 
     def apply_tags_to_articles(self) -> None:
         """Apply content-based tags to articles based on tag definitions."""
@@ -453,30 +953,101 @@ class ArticleTagger:
         active_tag_ids = self._get_active_tag_ids()
         logger.info(f"Found {len(active_tag_ids)} active tags")
 
-        all_work_units = []
-        for article in articles:
-            work_units = self._prepare_article_work_units(article, active_tag_ids)
-            all_work_units.extend(work_units)
-        logger.info(f"Created {len(all_work_units)} work units")
-
-        if all_work_units:
-            results_by_article = self._process_work_units(all_work_units)
-            self._apply_tag_results_to_articles(results_by_article)
-
-            # Initialize tagStats before processing any tags
-            tagStats = {}
-            # First, count all direct tag matches from content-based tagging
-            for _, results in results_by_article.items():
-                for tag_id in results.get("matches", {}):
-                    tagStats[tag_id] = tagStats.get(tag_id, 0) + 1
-
-            for tag_id, count in tagStats.items():
-                tag_details = self.tag_details_cache.get(tag_id)
-                if tag_details:
-                    logger.info(f"Tag {tag_details['name']}: {count} articles")
-
+        tagStats = self._process_articles(articles, active_tag_ids)
+        self.log_tag_stats(tagStats)
         logger.info("Tagging process completed")
 
+    async def _summarize_and_tag_async(
+        self,
+        article_paths: List[str],
+        articles_to_tag: List[Tuple[int, str, str, str]],
+        active_tag_ids: Set[int],
+        summary_metrics: llm.StageMetrics,
+        tag_metrics: llm.StageMetrics,
+    ) -> Tuple[List[Tuple[bool, str, bool, str]], Dict[int, int]]:
+        article_queue: asyncio.Queue = asyncio.Queue()
+        queued_ids = set()
+
+        def enqueue(article: Tuple[int, str, str, str]) -> None:
+            # New summaries only fill what the backlog left of the session cap
+            if len(queued_ids) >= self.max_articles_per_session:
+                return
+            if article[0] not in queued_ids:
+                queued_ids.add(article[0])
+                article_queue.put_nowait(article)
+
+        async def on_summary(file_hash: str, file_name: str, summary: str) -> None:
+            article = await asyncio.to_thread(db.get_article_by_hash, file_hash)
+            if article is None:
+                # Not in the database yet, so it is tagged in a later session
+                return
+            enqueue((article["id"], file_hash, file_name, summary))
+
+        for article in articles_to_tag:
+            enqueue(article)
+
+        async with llm.LLMEngine() as engine:
+            tagging = asyncio.create_task(
+                self.tag_article_stream_async(
+                    engine, article_queue, active_tag_ids, tag_metrics
+                )
+            )
+            try:
+                results = await articleSummary.summarize_paths_async(
+                    engine, article_paths, on_summary, summary_metrics
+                )
+            finally:
+                article_queue.put_nowait(None)
+            match_counts = await tagging
+        return results, match_counts
+
+    def summarize_and_apply_tags(self, article_paths: List[str]) -> None:
+        """Summarize article_paths and tag articles on one shared LLM engine.
+
+        Articles that already have a summary but lack verdicts are queued for
+        tagging straight away, and each newly generated summary queues its
+        article as soon as it is done, so both stages share the engine's
+        concurrency instead of running one after the other. As in sequential
+        mode, at most maxArticlesToTagPerSession articles are tagged; newly
+        summarized articles beyond that wait for a later session.
+        """
+        logger.info("Starting combined summarization and tagging...")
+        articles_to_tag = self._get_articles_needing_tagging()
+        active_tag_ids = self._get_active_tag_ids()
+        logger.info(
+            f"Summarizing {len(article_paths)} articles, "
+            f"tagging {len(articles_to_tag)} already summarized articles "
+            f"with {len(active_tag_ids)} active tags"
+        )
+        summary_metrics = llm.StageMetrics("summarize")
+        tag_metrics = llm.StageMetrics("tag")
+        results, tagStats = asyncio.run(
+            self._summarize_and_tag_async(
+                article_paths, articles_to_tag, active_tag_ids, summary_metrics, tag_metrics
+            )
+        )
+        articleSummary.report_summary_results(article_paths, results)
+        self.log_tag_stats(tagStats)
+        summary_metrics.log()
+        tag_metrics.log()
+        logger.info("Combined summarization and tagging completed")
+
+    def log_tag_stats(self, tagStats: Dict[int, int]) -> None:
+        for tag_id, count in tagStats.items():
+            tag_details = self.tag_details_cache.get(tag_id)
+            if tag_details:
+                logger.info(f"Tag {tag_details['name']}: {count} articles")
+
+
+def summarize_and_tag_articles(articles_path: Optional[str] = None) -> None:
+    """Summarize and tag articles as one streaming pipeline; see
+    ArticleTagger.summarize_and_apply_tags."""
+    load_environment_variables()
+    article_paths = articleSummary.select_articles_to_summarize(articles_path)
+    TagManager().sync_tags_from_config()
+    logger.info("Tags synced from config")
+    ArticleTagger().summarize_and_apply_tags(article_paths)
+
 
 def analyze_tag_results(tag_name: str) -> None:
     """Analyze which articles match or do not match a specific tag and output a markdown report."""
@@ -491,11 +1062,14 @@ def analyze_tag_results(tag_name: str) -> None:
     matching_urls = []
     matching_files = []
     
+    source_urls = db.get_source_urls()
     for file_name in matching_articles:
         filePath = os.path.join(getConfig()["articleFileFolder"], file_name)
         # For HTML and MHTML files, try to get the URL
         if file_name.lower().endswith(('.html', '.mhtml')) and os.path.exists(filePath):
-            url = utils.getUrlOfArticle(filePath)
+            _, url = source_urls.get(file_name, (None, None))
+            if url is None:
+                url = utils.getUrlOfArticle(filePath)
             if url:  # Only use URL if one was found
                 matching_urls.append(url)
                 continue
@@ -510,7 +1084,9 @@ def analyze_tag_results(tag_name: str) -> None:
         filePath = os.path.join(getConfig()["articleFileFolder"], file_name)
         # For HTML and MHTML files, try to get the URL
         if file_name.lower().endswith(('.html', '.mhtml')) and os.path.exists(filePath):
-            url = utils.getUrlOfArticle(filePath)
+            _, url = source_urls.get(file_name, (None, None))
+            if url is None:
+                url = utils.getUrlOfArticle(filePath)
             if url:  # Only use URL if one was found
                 non_matching_urls.append(url)
                 continue
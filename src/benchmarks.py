@@ -0,0 +1,348 @@
+"""Micro-benchmarks for the storage and hashing layers.
+
+Run with e.g. `uv run -m src.benchmarks hashing --files 10000`. Every benchmark
+works on temporary files, a temporary database or a local stub LLM client,
+never on the real library or API.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from . import db
+from . import llm
+from . import utils
+
+
+def _use_temporary_database(tmp_dir: str) -> None:
+    db.STORAGE_DIR = Path(tmp_dir) / "storage"
+    db.DB_PATH = db.STORAGE_DIR / db.DB_FILENAME
+    db.setup_database()
+
+
+def _build_corpus(corpus_dir: str, file_count: int, min_size: int, max_size: int):
+    """Write file_count files with log-uniform sizes that share a common middle,
+    mimicking PDFs/MHTML snapshots built from the same template."""
+    rng = random.Random(0)
+    boilerplate = rng.randbytes(max_size)
+    paths = []
+    total_bytes = 0
+    for i in range(file_count):
+        size = int(min_size * (max_size / min_size) ** rng.random())
+        content = bytearray(boilerplate[:size])
+        content[:64] = rng.randbytes(64)
+        path = os.path.join(corpus_dir, f"doc_{i:05d}.pdf")
+        with open(path, "wb") as f:
+            f.write(content)
+        paths.append(path)
+        total_bytes += size
+    return paths, total_bytes
+
+
+def _report(label: str, seconds: float, file_count: int, total_bytes: int) -> None:
+    print(
+        f"{label:<28} {seconds:8.2f}s  {file_count / seconds:10.0f} files/s  "
+        f"{total_bytes / seconds / 1e6:8.1f} MB/s"
+    )
+
+
+def benchmark_hashing(file_count: int, min_size: int, max_size: int, workers: int):
+    tmp_dir = tempfile.mkdtemp(prefix="hash_bench_")
+    try:
+        _use_temporary_database(tmp_dir)
+        corpus_dir = os.path.join(tmp_dir, "corpus")
+        os.makedirs(corpus_dir)
+        paths, total_bytes = _build_corpus(corpus_dir, file_count, min_size, max_size)
+        print(
+            f"Corpus: {file_count} files, {total_bytes / 1e6:.1f} MB in {corpus_dir}\n"
+        )
+
+        for mode in utils.FILE_HASH_MODES:
+            start = time.perf_counter()
+            hashes = {utils.compute_normal_hash(path, mode) for path in paths}
+            _report(f"{mode} (serial)", time.perf_counter() - start, file_count, total_bytes)
+            print(f"{'':<28} {file_count - len(hashes)} colliding files")
+
+            start = time.perf_counter()
+            utils.calculate_normal_hashes(paths, mode, workers)
+            _report(
+                f"{mode} (threads, cold cache)",
+                time.perf_counter() - start,
+                file_count,
+                total_bytes,
+            )
+
+            start = time.perf_counter()
+            utils.calculate_normal_hashes(paths, mode, workers)
+            _report(
+                f"{mode} (threads, warm cache)",
+                time.perf_counter() - start,
+                file_count,
+                total_bytes,
+            )
+            print()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_db_writes(article_count: int, tag_count: int):
+    tmp_dir = tempfile.mkdtemp(prefix="db_bench_")
+    try:
+        _use_temporary_database(tmp_dir)
+        files = [
+            (f"hash_{i}", f"article_{i}.html", "html") for i in range(article_count)
+        ]
+        verdicts = [
+            (article_id, tag_id, (article_id + tag_id) % 3 == 0)
+            for article_id in range(1, article_count + 1)
+            for tag_id in range(1, tag_count + 1)
+        ]
+        print(
+            f"{article_count} files, {len(verdicts)} tag verdicts ({tag_count} tags per article)\n"
+        )
+
+        start = time.perf_counter()
+        for file_hash, file_name, file_format in files:
+            db.add_file_to_database(file_hash, file_name, file_format)
+        per_row_files = time.perf_counter() - start
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM article_summaries")
+
+        start = time.perf_counter()
+        db.add_files_bulk(files)
+        bulk_files = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for article_id, tag_id, matches in verdicts:
+            db.set_article_tag(article_id, tag_id, matches)
+        per_row_tags = time.perf_counter() - start
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM article_tags")
+
+        start = time.perf_counter()
+        db.set_article_tags_bulk(verdicts)
+        bulk_tags = time.perf_counter() - start
+
+        for label, per_row, bulk, rows in (
+            ("add files", per_row_files, bulk_files, len(files)),
+            ("set article tags", per_row_tags, bulk_tags, len(verdicts)),
+        ):
+            print(
+                f"{label:<18} per-row {per_row:7.2f}s ({rows / per_row:9.0f} rows/s)  "
+                f"bulk {bulk:7.3f}s ({rows / bulk:9.0f} rows/s)  {per_row / bulk:6.1f}x"
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_tagging_query(article_count: int, tag_count: int, batch_size: int):
+    tmp_dir = tempfile.mkdtemp(prefix="tag_query_bench_")
+    try:
+        _use_temporary_database(tmp_dir)
+        rng = random.Random(0)
+        with db.get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO article_summaries (file_hash, file_name, file_format, summary, status) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (f"hash_{i}", f"article_{i}.html", "html", "summary " * 50, db.STATUS_SUMMARIZED)
+                    for i in range(article_count)
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO tags (name, description, use_summary) VALUES (?, ?, 1)",
+                [(f"tag_{i}", f"description {i}") for i in range(tag_count)],
+            )
+        # Roughly 90% of articles are fully tagged, the rest have partial verdicts
+        verdicts = [
+            (article_id, tag_id, rng.random() < 0.1)
+            for article_id in range(1, article_count + 1)
+            for tag_id in range(1, tag_count + 1)
+            if rng.random() < 0.9 or tag_id == 1
+        ]
+        db.set_article_tags_bulk(verdicts)
+        print(f"{article_count} articles, {tag_count} tags, {len(verdicts)} verdicts\n")
+
+        for run in range(3):
+            start = time.perf_counter()
+            batch = db.get_articles_needing_tagging(batch_size)
+            print(
+                f"run {run + 1}: selected {len(batch)} articles in {time.perf_counter() - start:.3f}s"
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class _StubCompletions:
+    """Answers chat completions locally, with usage estimated at 4 chars/token.
+
+    Multi-tag requests occasionally get a verdict dropped (malformed_rate) to
+    exercise the single-tag fallback.
+    """
+
+    def __init__(self, malformed_rate: float, latency: float):
+        self.malformed_rate = malformed_rate
+        self.latency = latency
+        self.rng = random.Random(0)
+
+    async def create(self, model, messages, response_format=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        prompt = "".join(message["content"] for message in messages)
+        if response_format and response_format.get("type") == "json_schema":
+            content = json.dumps(
+                self._answer(response_format["json_schema"]["schema"], prompt)
+            )
+        else:
+            content = json.dumps({"matches": hash(prompt) % 3 == 0})
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4
+        )
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+    def _answer(self, schema, prompt):
+        """Fill an object schema with booleans, dropping one key now and then."""
+        keys = list(schema["properties"])
+        answer = {}
+        for key in keys:
+            if schema["properties"][key]["type"] == "object":
+                answer[key] = self._answer(schema["properties"][key], prompt + key)
+            else:
+                answer[key] = hash((key, prompt)) % 3 == 0
+        if schema["properties"][keys[0]]["type"] == "boolean" and (
+            self.rng.random() < self.malformed_rate
+        ):
+            answer.pop(keys[0])
+        return answer
+
+
+class _StubClient:
+    def __init__(self, completions: _StubCompletions):
+        self.chat = SimpleNamespace(completions=completions)
+
+    async def close(self):
+        pass
+
+
+def benchmark_tag_evaluation(
+    article_count: int, tag_count: int, malformed_rate: float, latency: float
+):
+    from .articleTagging import TagEvaluator
+
+    # The stub client never sends the key anywhere
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark-stub")
+    rng = random.Random(0)
+    summaries = [
+        " ".join(f"word{rng.randrange(5000)}" for _ in range(250))
+        for _ in range(article_count)
+    ]
+    tags = [
+        {
+            "id": tag_id,
+            "name": f"tag_{tag_id}",
+            "description": f"Articles about topic {tag_id}, "
+            + "with a reasonably detailed description of what belongs on the list. " * 2,
+        }
+        for tag_id in range(1, tag_count + 1)
+    ]
+    print(f"{article_count} articles, {tag_count} summary-based tags\n")
+
+    work_units = [
+        {"article_id": article_id, "file_name": f"article_{article_id}", "text": text, "tags": tags}
+        for article_id, text in enumerate(summaries, start=1)
+    ]
+
+    async def run(batch_size: int, pack_token_budget: int):
+        llm.response_cache.hits = llm.response_cache.misses = 0
+        evaluator = TagEvaluator()
+        evaluator.batch_size = batch_size
+        evaluator.pack_token_budget = pack_token_budget
+        client = _StubClient(_StubCompletions(malformed_rate, latency))
+        verdicts = []
+        async with llm.LLMEngine(client=client) as engine:
+            start = time.perf_counter()
+            await evaluator.evaluate_work_units_async(
+                engine, work_units, lambda article_id, v: verdicts.append(len(v))
+            )
+            elapsed = time.perf_counter() - start
+            return engine.metrics(), sum(verdicts), elapsed
+
+    # Responses are cached in the database, so give each invocation a fresh one;
+    # the final rerun shows what an unchanged corpus costs the second time
+    tmp_dir = tempfile.mkdtemp(prefix="tag_eval_bench_")
+    try:
+        _use_temporary_database(tmp_dir)
+        for label, batch_size, pack_token_budget in (
+            ("single-tag", 1, 0),
+            ("multi-tag", tag_count, 0),
+            ("packed", tag_count, 8000),
+            ("rerun", tag_count, 8000),
+        ):
+            metrics, verdicts, elapsed = asyncio.run(run(batch_size, pack_token_budget))
+            print(
+                f"{label:<11} {metrics['requests'] / article_count:6.2f} requests/article  "
+                f"{metrics['prompt_tokens'] / article_count:8.0f} prompt tokens/article  "
+                f"{metrics['completion_tokens'] / article_count:6.0f} completion tokens/article  "
+                f"{metrics['cache_hits']:6d} cache hits  "
+                f"{verdicts} verdicts  {elapsed:.2f}s"
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run storage micro-benchmarks.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    hashing = subparsers.add_parser(
+        "hashing", help="Fingerprint throughput on a synthetic corpus"
+    )
+    hashing.add_argument("--files", type=int, default=10000)
+    hashing.add_argument("--min-size", type=int, default=2 * 1024)
+    hashing.add_argument("--max-size", type=int, default=2 * 1024 * 1024)
+    hashing.add_argument("--workers", type=int, default=None)
+
+    db_writes = subparsers.add_parser(
+        "db-writes", help="Per-row versus bulk inserts on a temporary database"
+    )
+    db_writes.add_argument("--articles", type=int, default=2000)
+    db_writes.add_argument("--tags", type=int, default=5)
+
+    tagging_query = subparsers.add_parser(
+        "tagging-query", help="Time selecting the next tagging batch"
+    )
+    tagging_query.add_argument("--articles", type=int, default=100000)
+    tagging_query.add_argument("--tags", type=int, default=5)
+    tagging_query.add_argument("--batch-size", type=int, default=2000)
+
+    tag_evaluation = subparsers.add_parser(
+        "tag-evaluation",
+        help="Requests and tokens per article for single-tag, multi-tag and packed evaluation (stub client)",
+    )
+    tag_evaluation.add_argument("--articles", type=int, default=500)
+    tag_evaluation.add_argument("--tags", type=int, default=8)
+    tag_evaluation.add_argument("--malformed-rate", type=float, default=0.05)
+    tag_evaluation.add_argument("--latency", type=float, default=0.01)
+
+    args = parser.parse_args()
+    if args.benchmark == "hashing":
+        benchmark_hashing(args.files, args.min_size, args.max_size, args.workers)
+    elif args.benchmark == "db-writes":
+        benchmark_db_writes(args.articles, args.tags)
+    elif args.benchmark == "tagging-query":
+        benchmark_tagging_query(args.articles, args.tags, args.batch_size)
+    elif args.benchmark == "tag-evaluation":
+        benchmark_tag_evaluation(
+            args.articles, args.tags, args.malformed_rate, args.latency
+        )
+
+
+if __name__ == "__main__":
+    main()
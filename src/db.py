@@ -1,9 +1,12 @@
 import sqlite3
 import os
+import atexit
+import threading
+import time
 import json
 import hashlib
 from pathlib import Path
-from typing import Dict, List, Tuple, Any, Set, Optional
+from typing import Dict, List, Tuple, Any, Set, Optional, Iterable
 from loguru import logger
 from . import utils
 
@@ -11,6 +14,7 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 STORAGE_DIR = PROJECT_ROOT / "storage"
 DB_FILENAME = "article_summaries.db"
 DB_PATH = STORAGE_DIR / DB_FILENAME
+HASH_CACHE_COLUMNS = ("normal_hash", "ipfs_hash", "sampled_hash", "full_hash")
 
 
 def get_db_path() -> str:
@@ -18,11 +22,91 @@ def get_db_path() -> str:
     return str(DB_PATH)
 
 
+# Size of each connection's prepared statement cache (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 512
+
+# Values of article_summaries.status; only "summarized" rows hold a summary
+STATUS_PENDING = "pending"
+STATUS_SUMMARIZED = "summarized"
+STATUS_INSUFFICIENT_TEXT = "insufficient_text"
+STATUS_EXTRACTION_FAILED = "extraction_failed"
+ARTICLE_STATUSES = (
+    STATUS_PENDING,
+    STATUS_SUMMARIZED,
+    STATUS_INSUFFICIENT_TEXT,
+    STATUS_EXTRACTION_FAILED,
+)
+# How summarization and tagging order their backlog; see prioritize_articles
+DEFAULT_ARTICLE_PRIORITY = {
+    "unread_weight": 2.0,
+    "recency_weight": 1.0,
+    "recency_half_life_days": 30.0,
+    "backlog_share": 0.25,
+}
+# Placeholders that used to be stored in the summary column instead of a status
+SUMMARY_SENTINELS = {
+    "failed_to_summarise": STATUS_INSUFFICIENT_TEXT,
+    "failed_to_extract": STATUS_EXTRACTION_FAILED,
+}
+
+_thread_local = threading.local()
+
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    # check_same_thread is off only so a connection can be closed by the garbage
+    # collector after its owning thread exits; it is never shared between threads.
+    conn = sqlite3.connect(
+        db_path,
+        timeout=30,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
 def get_connection() -> sqlite3.Connection:
-    return sqlite3.connect(get_db_path())
+    """Return the calling thread's long-lived connection, opening it on first use.
+
+    Connections run in WAL mode with synchronous=NORMAL, so commits no longer
+    fsync and concurrent readers never block the writer. Use the connection
+    as a context manager to commit or roll back; do not close it.
+    """
+    db_path = get_db_path()
+    conn = getattr(_thread_local, "conn", None)
+    if conn is None or _thread_local.db_path != db_path:
+        if conn is not None:
+            conn.close()
+        conn = _open_connection(db_path)
+        _thread_local.conn = conn
+        _thread_local.db_path = db_path
+    return conn
+
+
+def close_connection() -> None:
+    """Close the calling thread's connection, if it has one."""
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _thread_local.conn = None
+
+
+atexit.register(close_connection)
+
+
+# Path of the database whose schema has been created in this process
+_ready_db_path: Optional[str] = None
+
+
+def ensure_database() -> None:
+    """Run setup_database once per process for the current database path."""
+    if _ready_db_path != get_db_path():
+        setup_database()
 
 
 def setup_database() -> str:
+    global _ready_db_path
     db_path = get_db_path()
     with get_connection() as conn:
         conn.executescript(
@@ -35,7 +119,9 @@ def setup_database() -> str:
                 summary TEXT,
                 extraction_method TEXT,
                 word_count INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                source_url TEXT,
+                status TEXT NOT NULL DEFAULT 'pending'
             );
             CREATE TABLE IF NOT EXISTS tags (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -55,23 +141,132 @@ def setup_database() -> str:
                 FOREIGN KEY (article_id) REFERENCES article_summaries(id),
                 FOREIGN KEY (tag_id) REFERENCES tags(id)
             );
+            CREATE INDEX IF NOT EXISTS idx_article_tags_tag_matches ON article_tags(tag_id, matches);
+            CREATE INDEX IF NOT EXISTS idx_article_tags_article ON article_tags(article_id);
             CREATE TABLE IF NOT EXISTS tag_hashes (
                 tag_id INTEGER PRIMARY KEY,
                 property_hash TEXT,
                 FOREIGN KEY (tag_id) REFERENCES tags(id)
             );
+            CREATE TABLE IF NOT EXISTS file_index (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                is_read BOOLEAN NOT NULL DEFAULT 0,
+                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_file_index_folder ON file_index(folder);
+            CREATE INDEX IF NOT EXISTS idx_file_index_file_name ON file_index(file_name);
+            CREATE TABLE IF NOT EXISTS file_hash_cache (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                normal_hash TEXT,
+                ipfs_hash TEXT,
+                sampled_hash TEXT,
+                full_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS summary_attempts (
+                file_hash TEXT PRIMARY KEY,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                last_attempt_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache(last_used_at);
+            CREATE TABLE IF NOT EXISTS short_url_cache (
+                short_url TEXT PRIMARY KEY,
+                expanded_url TEXT,
+                resolved_at REAL NOT NULL
+            );
             """
         )
+        cursor = conn.execute("PRAGMA table_info(file_hash_cache)")
+        columns = {row[1] for row in cursor.fetchall()}
+        for col in HASH_CACHE_COLUMNS:
+            if col not in columns:
+                conn.execute(f"ALTER TABLE file_hash_cache ADD COLUMN {col} TEXT")
+        cursor = conn.execute("PRAGMA table_info(article_summaries)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if "source_url" not in columns:
+            conn.execute("ALTER TABLE article_summaries ADD COLUMN source_url TEXT")
+        if "status" not in columns:
+            _migrate_summary_sentinels(conn)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_article_summaries_status ON article_summaries(status)"
+        )
+    _ready_db_path = db_path
     return db_path
 
 
+def _migrate_summary_sentinels(conn: sqlite3.Connection) -> None:
+    """Add the status column and derive it from the old summary placeholders.
+
+    Error text stored by older versions ("Failed to generate summary: ...")
+    marks the article as pending again so it is retried.
+    """
+    conn.execute(
+        "ALTER TABLE article_summaries ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'"
+    )
+    conn.execute(
+        """
+        UPDATE article_summaries SET status = CASE
+            WHEN summary = 'failed_to_summarise' THEN ?
+            WHEN summary = 'failed_to_extract' THEN ?
+            WHEN summary LIKE 'Failed to generate summary%' THEN ?
+            WHEN summary IS NOT NULL AND summary != '' THEN ?
+            ELSE ?
+        END
+        """,
+        (
+            STATUS_INSUFFICIENT_TEXT,
+            STATUS_EXTRACTION_FAILED,
+            STATUS_PENDING,
+            STATUS_SUMMARIZED,
+            STATUS_PENDING,
+        ),
+    )
+    conn.execute(
+        "UPDATE article_summaries SET summary = NULL WHERE status != ?",
+        (STATUS_SUMMARIZED,),
+    )
+    logger.info("Migrated summary placeholders to article_summaries.status")
+
+
+def summary_status(summary: Optional[str]) -> Tuple[Optional[str], str]:
+    """Split a value passed as a summary into (summary to store, status).
+
+    Callers may pass the legacy placeholders failed_to_summarise and
+    failed_to_extract; they are stored as a status with no summary.
+    """
+    if summary in SUMMARY_SENTINELS:
+        return None, SUMMARY_SENTINELS[summary]
+    if not summary:
+        return None, STATUS_PENDING
+    return summary, STATUS_SUMMARIZED
+
+
 # Article Summary Operations
 
 
 def get_article_by_hash(file_hash: str) -> Optional[Dict[str, Any]]:
     with get_connection() as conn:
         cursor = conn.execute(
-            "SELECT id, file_hash, file_name, file_format, summary, extraction_method, word_count, created_at FROM article_summaries WHERE file_hash = ?",
+            "SELECT id, file_hash, file_name, file_format, summary, extraction_method, word_count, created_at, status FROM article_summaries WHERE file_hash = ?",
             (file_hash,),
         )
         row = cursor.fetchone()
@@ -86,13 +281,14 @@ def get_article_by_hash(file_hash: str) -> Optional[Dict[str, Any]]:
         "extraction_method": row[5],
         "word_count": row[6],
         "created_at": row[7],
+        "status": row[8],
     }
 
 
 def get_article_by_file_name(file_name: str) -> Optional[Dict[str, Any]]:
     with get_connection() as conn:
         cursor = conn.execute(
-            "SELECT id, file_hash, file_name, file_format, summary, extraction_method, word_count, created_at FROM article_summaries WHERE file_name = ?",
+            "SELECT id, file_hash, file_name, file_format, summary, extraction_method, word_count, created_at, status FROM article_summaries WHERE file_name = ?",
             (file_name,),
         )
         row = cursor.fetchone()
@@ -107,6 +303,7 @@ def get_article_by_file_name(file_name: str) -> Optional[Dict[str, Any]]:
         "extraction_method": row[5],
         "word_count": row[6],
         "created_at": row[7],
+        "status": row[8],
     }
 
 
@@ -118,14 +315,19 @@ def update_article_summary(
     extraction_method: str,
     word_count: int,
 ) -> int:
+    summary, status = summary_status(summary)
     with get_connection() as conn:
-        article = get_article_by_hash(file_hash)
+        cursor = conn.execute(
+            "SELECT id FROM article_summaries WHERE file_hash = ?", (file_hash,)
+        )
+        row = cursor.fetchone()
+        article = {"id": row[0]} if row else None
         if article is not None:
             # Article exists, update it
             conn.execute(
                 """
                 UPDATE article_summaries
-                SET file_name = ?, file_format = ?, summary = ?, extraction_method = ?, word_count = ?
+                SET file_name = ?, file_format = ?, summary = ?, extraction_method = ?, word_count = ?, status = ?
                 WHERE id = ?
                 """,
                 (
@@ -134,6 +336,7 @@ def update_article_summary(
                     summary,
                     extraction_method,
                     word_count,
+                    status,
                     article["id"],
                 ),
             )
@@ -142,8 +345,8 @@ def update_article_summary(
             # Article doesn't exist, insert it
             cursor = conn.execute(
                 """
-                INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     file_hash,
@@ -152,13 +355,48 @@ def update_article_summary(
                     summary,
                     extraction_method,
                     word_count,
+                    status,
                 ),
             )
             article_id = cursor.lastrowid
+        # A stored outcome ends any run of failed attempts
+        conn.execute("DELETE FROM summary_attempts WHERE file_hash = ?", (file_hash,))
         conn.commit()
     return article_id
 
 
+def update_article_summaries_bulk(
+    rows: Iterable[Tuple[str, str, str, str, str, int]],
+) -> None:
+    """Apply many update_article_summary calls in one transaction.
+
+    Each row is (file_hash, file_name, file_format, summary, extraction_method,
+    word_count); rows whose hash is unknown are inserted. Their failed
+    attempts are forgotten.
+    """
+    with get_connection() as conn:
+        for file_hash, file_name, file_format, summary, extraction_method, word_count in rows:
+            summary, status = summary_status(summary)
+            cursor = conn.execute(
+                """
+                UPDATE article_summaries
+                SET file_name = ?, file_format = ?, summary = ?, extraction_method = ?, word_count = ?, status = ?
+                WHERE file_hash = ?
+                """,
+                (file_name, file_format, summary, extraction_method, word_count, status, file_hash),
+            )
+            if cursor.rowcount == 0:
+                conn.execute(
+                    """
+                    INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (file_hash, file_name, file_format, summary, extraction_method, word_count, status),
+                )
+            conn.execute("DELETE FROM summary_attempts WHERE file_hash = ?", (file_hash,))
+        conn.commit()
+
+
 def add_file_to_database(
     file_hash: str,
     file_name: str,
@@ -167,6 +405,7 @@ def add_file_to_database(
     extraction_method: Optional[str] = None,
     word_count: int = 0,
 ) -> int:
+    summary, status = summary_status(summary)
     with get_connection() as conn:
         # Check for article with matching hash or file name
         cursor = conn.execute(
@@ -185,7 +424,8 @@ def add_file_to_database(
                 """
                 UPDATE article_summaries 
                 SET file_hash = ?, file_name = ?, file_format = ?, 
-                    summary = ?, extraction_method = ?, word_count = ?
+                    summary = ?, extraction_method = ?, word_count = ?, status = ?,
+                    source_url = CASE WHEN file_hash = ? THEN source_url END
                 WHERE id = ?
                 """,
                 (
@@ -195,6 +435,8 @@ def add_file_to_database(
                     summary,
                     extraction_method,
                     word_count,
+                    status,
+                    file_hash,
                     article_id,
                 ),
             )
@@ -204,27 +446,233 @@ def add_file_to_database(
         # Insert new article if no match found
         cursor = conn.execute(
             """
-            INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (file_hash, file_name, file_format, summary, extraction_method, word_count),
+            (file_hash, file_name, file_format, summary, extraction_method, word_count, status),
         )
         article_id = cursor.lastrowid
         conn.commit()
     return article_id
 
 
+def add_files_bulk(files: Iterable[Tuple[str, str, str]]) -> int:
+    """Register many (file_hash, file_name, file_format) entries in one transaction.
+
+    Matching follows add_file_to_database: an entry whose hash or file name is
+    already known updates that row (clearing its summary), anything else is
+    inserted.
+
+    Returns:
+        int: Number of entries written
+    """
+    files = list(files)
+    if not files:
+        return 0
+    with get_connection() as conn:
+        # Rows are [id, file_hash, file_name, file_format]; new rows have no id yet
+        rows_by_hash = {}
+        rows_by_name = {}
+        cursor = conn.execute("SELECT id, file_hash, file_name FROM article_summaries")
+        for article_id, file_hash, file_name in cursor.fetchall():
+            row = [article_id, file_hash, file_name, None]
+            rows_by_hash[file_hash] = row
+            rows_by_name[file_name] = row
+
+        changed_rows = {}
+        for file_hash, file_name, file_format in files:
+            row = rows_by_hash.get(file_hash) or rows_by_name.get(file_name)
+            if row is None:
+                row = [None, None, None, None]
+            else:
+                rows_by_hash.pop(row[1], None)
+                rows_by_name.pop(row[2], None)
+            row[1:] = [file_hash, file_name, file_format]
+            rows_by_hash[file_hash] = row
+            rows_by_name[file_name] = row
+            changed_rows[id(row)] = row
+
+        update_rows = [row for row in changed_rows.values() if row[0] is not None]
+        insert_rows = [row for row in changed_rows.values() if row[0] is None]
+        try:
+            conn.executemany(
+                """
+                UPDATE article_summaries
+                SET file_hash = ?, file_name = ?, file_format = ?,
+                    summary = NULL, extraction_method = NULL, word_count = 0, status = 'pending',
+                    source_url = CASE WHEN file_hash = ? THEN source_url END
+                WHERE id = ?
+                """,
+                [(h, n, f, h, article_id) for article_id, h, n, f in update_rows],
+            )
+            conn.executemany(
+                """
+                INSERT INTO article_summaries (file_hash, file_name, file_format, summary, extraction_method, word_count)
+                VALUES (?, ?, ?, NULL, NULL, 0)
+                """,
+                [(h, n, f) for _, h, n, f in insert_rows],
+            )
+            conn.commit()
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            logger.warning(f"Bulk file registration failed ({e}), retrying row by row")
+            for file_hash, file_name, file_format in files:
+                try:
+                    add_file_to_database(file_hash, file_name, file_format)
+                except sqlite3.IntegrityError as row_error:
+                    logger.error(f"Could not register {file_name}: {row_error}")
+    return len(files)
+
+
+def get_all_article_file_names() -> List[Tuple[int, str, str]]:
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT id, file_name, file_hash FROM article_summaries")
+        return cursor.fetchall()
+
+
+def rewrite_file_hashes(new_hashes: Dict[int, str]) -> Tuple[int, int]:
+    """Replace file_hash for the given article ids in a single transaction.
+
+    Rows keep their id, so summaries and tag assignments are untouched, and
+    summarization failure records move to the new hash.
+    A row whose new hash already belongs to another article keeps its old hash.
+
+    Returns:
+        Tuple[int, int]: Number of rows rewritten and number skipped due to collisions
+    """
+    rewritten = 0
+    collisions = 0
+    with get_connection() as conn:
+        for article_id, file_hash in new_hashes.items():
+            row = conn.execute(
+                "SELECT file_hash FROM article_summaries WHERE id = ?", (article_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            try:
+                conn.execute(
+                    "UPDATE article_summaries SET file_hash = ? WHERE id = ?",
+                    (file_hash, article_id),
+                )
+                conn.execute(
+                    "UPDATE OR REPLACE summary_attempts SET file_hash = ? WHERE file_hash = ?",
+                    (file_hash, row[0]),
+                )
+                rewritten += 1
+            except sqlite3.IntegrityError:
+                logger.warning(
+                    f"Hash {file_hash} of article {article_id} already belongs to another article, keeping old hash"
+                )
+                collisions += 1
+        conn.commit()
+    return rewritten, collisions
+
+
 def get_all_file_hashes() -> List[str]:
     with get_connection() as conn:
         cursor = conn.execute("SELECT file_hash FROM article_summaries")
         return [row[0] for row in cursor.fetchall()]
 
 
+def _article_priority_settings() -> Dict[str, float]:
+    settings = dict(DEFAULT_ARTICLE_PRIORITY)
+    settings.update(utils.getConfig().get("article_priority", {}))
+    return {key: float(value) for key, value in settings.items()}
+
+
+def _priority_score_sql(settings: Dict[str, float], alias: str = "a") -> Tuple[str, Tuple]:
+    """SQL expression scoring an article row, and its parameters.
+
+    Unread articles (names not starting with ".") get unread_weight; recency
+    adds recency_weight / (1 + age / half-life), so an article added
+    recency_half_life_days ago gets half the bonus of one added today.
+    """
+    return (
+        f"""(? * ({alias}.file_name NOT LIKE '.%')
+            + ? / (1.0 + MAX(COALESCE(julianday('now') - julianday({alias}.created_at), 0), 0) / ?))""",
+        (
+            settings["unread_weight"],
+            settings["recency_weight"],
+            max(settings["recency_half_life_days"], 1e-6),
+        ),
+    )
+
+
+def prioritize_articles(
+    rows_by_score: List[Tuple],
+    rows_by_age: List[Tuple],
+    backlog_share: float,
+    limit: Optional[int] = None,
+) -> List[Tuple]:
+    """Order rows (keyed by their first element) for a session's budget.
+
+    Rows come in by descending score, but every round(1 / backlog_share)-th
+    slot goes to the oldest row not yet taken, so a steady stream of new
+    unread articles cannot starve the backlog. At most `limit` rows are
+    returned, so each list only needs its first `limit` rows.
+    """
+    if limit is None:
+        limit = len(rows_by_score)
+    if backlog_share <= 0:
+        return list(rows_by_score[:limit])
+    every = max(1, round(1 / min(backlog_share, 1.0)))
+    by_score, by_age = iter(rows_by_score), iter(rows_by_age)
+    taken = set()
+    ordered = []
+    while len(ordered) < limit:
+        source = by_age if (len(ordered) + 1) % every == 0 else by_score
+        other = by_score if source is by_age else by_age
+        row = next((row for row in source if row[0] not in taken), None)
+        if row is None:
+            row = next((row for row in other if row[0] not in taken), None)
+            if row is None:
+                break
+        taken.add(row[0])
+        ordered.append(row)
+    return ordered
+
+
+def record_summary_failure(
+    file_hash: str, error: str, base_delay: float, max_delay: float
+) -> Tuple[int, float]:
+    """Count a failed summarization attempt and schedule the next one.
+
+    The wait doubles with every consecutive failure, starting at base_delay
+    seconds and capped at max_delay.
+
+    Returns:
+        Tuple[int, float]: Consecutive failed attempts and the time the article
+        is eligible again
+    """
+    now = time.time()
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO summary_attempts (file_hash, attempts, last_error, last_attempt_at, next_attempt_at)
+            VALUES (?, 1, ?, ?, ?)
+            ON CONFLICT(file_hash) DO UPDATE SET
+                attempts = attempts + 1,
+                last_error = excluded.last_error,
+                last_attempt_at = excluded.last_attempt_at,
+                next_attempt_at = excluded.last_attempt_at + MIN(?, ? * (1 << MIN(attempts, 40)))
+            """,
+            (file_hash, error, now, now + min(base_delay, max_delay), max_delay, base_delay),
+        )
+        conn.commit()
+        row = conn.execute(
+            "SELECT attempts, next_attempt_at FROM summary_attempts WHERE file_hash = ?",
+            (file_hash,),
+        ).fetchone()
+    return row[0], row[1]
+
+
 def get_articles_needing_summary() -> List[Tuple[str, str]]:
+    """Get (file_hash, file_name) of articles waiting for a summary, in priority
+    order (see prioritize_articles)."""
     with get_connection() as conn:
         # First, let's check if there are any inconsistencies in the data
         cursor = conn.execute(
-            "SELECT COUNT(*) FROM article_summaries WHERE summary IS NOT NULL AND summary != '' AND summary != 'failed_to_summarise' AND summary != 'failed_to_extract'"
+            "SELECT COUNT(*) FROM article_summaries WHERE status = ?", (STATUS_SUMMARIZED,)
         )
         summarized_count = cursor.fetchone()[0]
 
@@ -236,10 +684,59 @@ def get_articles_needing_summary() -> List[Tuple[str, str]]:
         )
 
         # Get articles that truly need summarization
+        # Articles whose recent attempts failed wait until their backoff expires
+        settings = _article_priority_settings()
+        score_sql, score_params = _priority_score_sql(settings)
         cursor = conn.execute(
-            "SELECT file_hash, file_name FROM article_summaries WHERE summary IS NULL OR summary = '' OR (summary != 'failed_to_summarise' AND summary != 'failed_to_extract' AND summary = '')"
+            f"""
+            SELECT a.file_hash, a.file_name, a.created_at FROM article_summaries a
+            LEFT JOIN summary_attempts sa ON sa.file_hash = a.file_hash
+            WHERE a.status = ? AND (sa.next_attempt_at IS NULL OR sa.next_attempt_at <= ?)
+            ORDER BY {score_sql} DESC, a.id DESC
+            """,
+            (STATUS_PENDING, time.time(), *score_params),
         )
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+        rows_by_age = sorted(rows, key=lambda row: row[2] or "")
+        articles = [
+            (file_hash, file_name)
+            for file_hash, file_name, _ in prioritize_articles(
+                rows, rows_by_age, settings["backlog_share"]
+            )
+        ]
+        cursor = conn.execute(
+            "SELECT COUNT(*) FROM summary_attempts WHERE next_attempt_at > ?",
+            (time.time(),),
+        )
+        backed_off = cursor.fetchone()[0]
+        if backed_off:
+            logger.info(f"Skipping {backed_off} articles whose recent summary attempts failed")
+        return articles
+
+
+def rename_articles(renames: Dict[int, Tuple[str, str]]) -> int:
+    """Point article rows at new file names in a single transaction.
+
+    Rows keep their id, summary and tag assignments.
+
+    Args:
+        renames: Mapping of article id to (file_name, file_format)
+
+    Returns:
+        int: Number of articles renamed
+    """
+    if not renames:
+        return 0
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE article_summaries SET file_name = ?, file_format = ? WHERE id = ?",
+            [
+                (file_name, file_format, article_id)
+                for article_id, (file_name, file_format) in renames.items()
+            ],
+        )
+        conn.commit()
+    return len(renames)
 
 
 def remove_nonexistent_files(existing_files: Set[str]) -> int:
@@ -260,6 +757,13 @@ def remove_nonexistent_files(existing_files: Set[str]) -> int:
                 f"DELETE FROM article_summaries WHERE id IN ({placeholders})",
                 files_to_remove,
             )
+            conn.execute(
+                """
+                DELETE FROM summary_attempts WHERE NOT EXISTS (
+                    SELECT 1 FROM article_summaries a WHERE a.file_hash = summary_attempts.file_hash
+                )
+                """
+            )
             conn.commit()
         return len(files_to_remove)
 
@@ -326,6 +830,209 @@ def remove_duplicate_file_entries() -> int:
     return removed_count
 
 
+# Settings Operations
+
+
+def get_setting(key: str) -> Optional[str]:
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT value FROM settings WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_setting(key: str, value: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value)
+        )
+        conn.commit()
+
+
+# LLM Response Cache Operations
+
+
+def get_cached_llm_response(cache_key: str) -> Optional[str]:
+    """Return a cached response; record the access with touch_llm_responses."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT response FROM llm_response_cache WHERE cache_key = ?", (cache_key,)
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def touch_llm_responses(last_used: Dict[str, float]) -> None:
+    """Set last_used_at for many cached responses in one transaction."""
+    if not last_used:
+        return
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE llm_response_cache SET last_used_at = ? WHERE cache_key = ?",
+            [(used_at, cache_key) for cache_key, used_at in last_used.items()],
+        )
+        conn.commit()
+
+
+def store_llm_response(cache_key: str, model: str, response: str) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO llm_response_cache (cache_key, model, response, size, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (cache_key, model, response, len(response.encode("utf-8")), time.time()),
+        )
+        conn.commit()
+
+
+def evict_llm_responses(max_bytes: int) -> int:
+    """Delete least recently used responses until the cache fits in max_bytes.
+
+    Returns:
+        int: Number of responses evicted
+    """
+    with get_connection() as conn:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_response_cache"
+        ).fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        evict_keys = []
+        cursor = conn.execute(
+            "SELECT cache_key, size FROM llm_response_cache ORDER BY last_used_at"
+        )
+        for cache_key, size in cursor:
+            if total <= max_bytes:
+                break
+            evict_keys.append((cache_key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_response_cache WHERE cache_key = ?", evict_keys)
+        conn.commit()
+    return len(evict_keys)
+
+
+# Short URL Cache Operations
+
+
+def get_expanded_url(short_url: str) -> Optional[Tuple[Optional[str], float]]:
+    """Return (expanded_url, resolved_at) for a cached short URL, or None if unknown.
+
+    expanded_url is None when resolving the short URL failed.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT expanded_url, resolved_at FROM short_url_cache WHERE short_url = ?",
+            (short_url,),
+        )
+        return cursor.fetchone()
+
+
+def store_expanded_url(
+    short_url: str, expanded_url: Optional[str], resolved_at: float
+) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO short_url_cache (short_url, expanded_url, resolved_at)
+            VALUES (?, ?, ?)
+            """,
+            (short_url, expanded_url, resolved_at),
+        )
+        conn.commit()
+
+
+# File Index Operations
+
+
+def sync_file_index(
+    folder: str, entries: List[Tuple[str, str, int, int, int, bool]]
+) -> Tuple[int, int]:
+    """Bring the indexed files of a folder in line with a fresh directory scan.
+
+    Args:
+        folder: Folder the scan was taken from (with trailing slash)
+        entries: (path, file_name, size, mtime_ns, inode, is_read) for every file found
+
+    Returns:
+        Tuple[int, int]: Number of rows inserted or updated, and number of rows removed
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT path, size, mtime_ns, inode FROM file_index WHERE folder = ?",
+            (folder,),
+        )
+        indexed = {row[0]: row[1:] for row in cursor.fetchall()}
+        changed_rows = [
+            (path, folder, file_name, size, mtime_ns, inode, 1 if is_read else 0)
+            for path, file_name, size, mtime_ns, inode, is_read in entries
+            if indexed.get(path) != (size, mtime_ns, inode)
+        ]
+        scanned_paths = {entry[0] for entry in entries}
+        removed_rows = [(path,) for path in indexed if path not in scanned_paths]
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO file_index (path, folder, file_name, size, mtime_ns, inode, is_read)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            changed_rows,
+        )
+        conn.executemany("DELETE FROM file_index WHERE path = ?", removed_rows)
+        conn.commit()
+    return len(changed_rows), len(removed_rows)
+
+
+def get_indexed_file_names(folder: str) -> List[str]:
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT file_name FROM file_index WHERE folder = ?", (folder,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+# File Hash Cache Operations
+
+def get_cached_file_hash(
+    path: str, size: int, mtime_ns: int, hash_column: str
+) -> Optional[str]:
+    """Return a cached hash for path, or None if missing or the file has changed since."""
+    if hash_column not in HASH_CACHE_COLUMNS:
+        raise ValueError(f"Unknown hash column: {hash_column}")
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"SELECT {hash_column} FROM file_hash_cache WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns),
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def store_file_hash(
+    path: str, size: int, mtime_ns: int, hash_column: str, file_hash: str
+) -> None:
+    """Cache a hash for path. Hashes recorded against an older stat of the file are dropped."""
+    if hash_column not in HASH_CACHE_COLUMNS:
+        raise ValueError(f"Unknown hash column: {hash_column}")
+    other_columns = [column for column in HASH_CACHE_COLUMNS if column != hash_column]
+    keep_other_hashes = ", ".join(
+        f"{column} = CASE WHEN size = excluded.size AND mtime_ns = excluded.mtime_ns THEN {column} ELSE NULL END"
+        for column in other_columns
+    )
+    with get_connection() as conn:
+        conn.execute(
+            f"""
+            INSERT INTO file_hash_cache (path, size, mtime_ns, {hash_column})
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                {hash_column} = excluded.{hash_column},
+                {keep_other_hashes},
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns
+            """,
+            (path, size, mtime_ns, file_hash),
+        )
+        conn.commit()
+
+
 # Tag Operations
 
 
@@ -523,6 +1230,27 @@ def set_article_tag(article_id: int, tag_id: int, matches: bool) -> None:
         conn.commit()
 
 
+def set_article_tags_bulk(tag_results: Iterable[Tuple[int, int, bool]]) -> int:
+    """Store many (article_id, tag_id, matches) verdicts in one transaction.
+
+    Returns:
+        int: Number of verdicts written
+    """
+    rows = [
+        (article_id, tag_id, 1 if matches else 0)
+        for article_id, tag_id, matches in tag_results
+    ]
+    if not rows:
+        return 0
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO article_tags (article_id, tag_id, matches) VALUES (?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    return len(rows)
+
+
 def remove_orphaned_tags() -> int:
     with get_connection() as conn:
         cursor = conn.execute(
@@ -562,39 +1290,76 @@ def get_articles_not_matching_tag(tag_name: str) -> List[str]:
 def get_articles_needing_tagging(
     max_articles: Optional[int] = None,
 ) -> List[Tuple[int, str, str, str]]:
-    # Get all active tags
-    all_tags = get_all_tag_details()
-
-    # If there are no tags, use the original approach
-    if not all_tags:
-        query = """
-            SELECT a.id, a.file_hash, a.file_name, a.summary 
-            FROM article_summaries a
-            WHERE NOT EXISTS (SELECT 1 FROM article_tags WHERE article_id = a.id)
-            AND a.summary IS NOT NULL AND a.summary != ''
-            ORDER BY RANDOM()
-        """
-    else:
-        # Count how many tags each article has and compare to the total number of tags
-        query = """
-            SELECT a.id, a.file_hash, a.file_name, a.summary 
-            FROM article_summaries a
-            WHERE a.summary IS NOT NULL AND a.summary != ''
-            AND (
-                (SELECT COUNT(DISTINCT tag_id) FROM article_tags WHERE article_id = a.id) < ?
-            )
-            ORDER BY RANDOM()
-        """
+    """Get summarized articles that are missing a verdict for at least one tag.
+
+    Articles come in priority order (see prioritize_articles), so unread and
+    recently added articles reach the reading lists first. SQLite finds the
+    candidates once and returns only the top max_articles of them by score and
+    the max_articles oldest, which are all prioritize_articles needs.
 
-    if max_articles:
-        query += f" LIMIT {max_articles}"
+    Args:
+        max_articles: Maximum number of articles to return (None for all)
 
+    Returns:
+        List of (id, file_hash, file_name, summary) tuples
+    """
+    # With no tags defined, every article lacks a verdict
+    tag_count = max(len(get_all_tags()), 1)
+    settings = _article_priority_settings()
+    score_sql, score_params = _priority_score_sql(settings)
+    # LIMIT -1 returns every candidate
+    limit = max_articles or -1
     with get_connection() as conn:
-        if all_tags:
-            cursor = conn.execute(query, (len(all_tags),))
-        else:
-            cursor = conn.execute(query)
-        return cursor.fetchall()
+        cursor = conn.execute(
+            f"""
+            WITH candidates AS (
+                SELECT a.id, a.file_hash, a.file_name, a.created_at, {score_sql} AS score
+                FROM article_summaries a
+                WHERE a.status = 'summarized'
+                AND (
+                    SELECT COUNT(*)
+                    FROM article_tags at
+                    JOIN tags t ON t.id = at.tag_id
+                    WHERE at.article_id = a.id
+                ) < ?
+            )
+            SELECT * FROM (
+                SELECT *, 0 FROM candidates ORDER BY score DESC, id DESC LIMIT ?
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT *, 1 FROM candidates ORDER BY created_at, id LIMIT ?
+            )
+            """,
+            (*score_params, tag_count, limit, limit if settings["backlog_share"] > 0 else 0),
+        )
+        rows_by_score = []
+        rows_by_age = []
+        for article_id, file_hash, file_name, created_at, score, by_age in cursor:
+            row = (article_id, file_hash, file_name, created_at, score)
+            (rows_by_age if by_age else rows_by_score).append(row)
+        # UNION ALL does not guarantee the order within each half
+        rows_by_score.sort(key=lambda row: (-row[4], -row[0]))
+        rows_by_age.sort(key=lambda row: (row[3] or "", row[0]))
+        rows = prioritize_articles(
+            rows_by_score, rows_by_age, settings["backlog_share"], max_articles
+        )
+
+        # Summaries are only loaded for the articles returned
+        summaries = {}
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            cursor = conn.execute(
+                f"SELECT id, summary FROM article_summaries WHERE id IN ({placeholders})",
+                chunk,
+            )
+            summaries.update(cursor.fetchall())
+    return [
+        (article_id, file_hash, file_name, summaries.get(article_id))
+        for article_id, file_hash, file_name, *_ in rows
+    ]
 
 
 def get_all_tags_with_article_count() -> List[Tuple[int, str, int]]:
@@ -629,142 +1394,129 @@ def clean_orphaned_database_items() -> Tuple[int, int]:
     return orphaned_tags, orphaned_hashes
 
 
+def get_source_urls() -> Dict[str, Tuple[int, Optional[str]]]:
+    """Map file names to (article id, cached source URL or None if not extracted yet)."""
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT file_name, id, source_url FROM article_summaries")
+        return {file_name: (article_id, url) for file_name, article_id, url in cursor}
+
+
+def get_articles_missing_source_url() -> List[Tuple[int, str]]:
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT id, file_name FROM article_summaries WHERE source_url IS NULL"
+        )
+        return cursor.fetchall()
+
+
+def set_source_urls(source_urls: Dict[int, str]) -> None:
+    """Cache extracted source URLs ('' when the file has none) by article id."""
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE article_summaries SET source_url = ? WHERE id = ?",
+            [(url, article_id) for article_id, url in source_urls.items()],
+        )
+        conn.commit()
+
+
+def _tag_filter_sql(
+    all_tags: List[str], any_tags: List[str], not_any_tags: List[str]
+) -> Tuple[str, List[str]]:
+    """Build WHERE conditions on article alias `a` for the given tag criteria."""
+    tag_match = """
+        SELECT 1 FROM article_tags at
+        JOIN tags t ON at.tag_id = t.id
+        WHERE at.article_id = a.id AND at.matches = 1 AND t.name {}
+    """
+    conditions = []
+    params = []
+    for tag in all_tags:
+        conditions.append(f"EXISTS ({tag_match.format('= ?')})")
+        params.append(tag)
+    if any_tags:
+        placeholders = ",".join("?" for _ in any_tags)
+        conditions.append(f"EXISTS ({tag_match.format(f'IN ({placeholders})')})")
+        params.extend(any_tags)
+    if not_any_tags:
+        placeholders = ",".join("?" for _ in not_any_tags)
+        conditions.append(
+            f"NOT EXISTS ({tag_match.format(f'IN ({placeholders})')})"
+        )
+        params.extend(not_any_tags)
+    return " AND ".join(conditions), params
+
+
 def searchArticlesByTags(
     all_tags=[], any_tags=[], not_any_tags=[], readState="", formats=[]
 ):
     """
     Search for articles that match specified tags.
 
+    Existence, read state and format come from the file index and URLs from
+    the cached source_url column, so the filesystem is only touched to extract
+    URLs that have not been cached yet.
+
     Args:
         all_tags: List of tags where all must match (AND logic)
         any_tags: List of tags where any must match (OR logic)
         not_any_tags: List of tags where none should match (NOT ANY logic)
         readState: Filter by read state ('read', 'unread', or '') - empty string means no filtering
         formats: List of file formats to include
-        path: Base path to search in
 
     Returns:
         Dict of article paths with their URLs
     """
     # Early return conditions
-    is_format_specific = (
-        formats
-        and len(formats) > 0
-        and formats != utils.getConfig()["docFormatsToMove"]
-    )
+    docFormatsToMove = utils.getConfig()["docFormatsToMove"]
+    is_format_specific = formats and len(formats) > 0 and formats != docFormatsToMove
     if not all_tags and not any_tags and not not_any_tags and not is_format_specific:
         return {}
 
-    # Get database path
-    db_path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-        "storage",
-        "article_summaries.db",
-    )
+    db_path = str(DB_PATH)
     if not os.path.exists(db_path):
         print(f"Tag database not found at {db_path}")
         return {}
 
-    # Get all article paths that match the format criteria
-    article_paths = utils.getArticlePathsForQuery("*", formats, readState=readState)
-
-    # If no tags specified and only filtering by format, just apply read state filter and return
-    if not all_tags and not any_tags and not not_any_tags:
-        matchingArticles = {
-            articlePath: utils.getUrlOfArticle(articlePath)
-            for articlePath in article_paths
-        }
-        return matchingArticles
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    try:
-        # Extract filenames from paths for efficient filtering
-        filenames = {os.path.basename(path): path for path in article_paths}
-
-        # Build SQL query for tag filtering
-        query_params = []
-
-        # Base SQL query to get article summaries
-        sql = """
-        SELECT as1.file_name, as1.id 
-        FROM article_summaries as1
-        WHERE as1.file_name IN ({})
-        """.format(
-            ",".join(["?"] * len(filenames))
+    folder = utils.ensureFileIndex()
+    formats = formats if formats else docFormatsToMove
+    has_tag_filters = bool(all_tags or any_tags or not_any_tags)
+
+    # Files only appear in results if they are present in the index
+    sql = f"""
+        SELECT fi.path, a.id, a.source_url
+        FROM file_index fi
+        {"JOIN" if has_tag_filters else "LEFT JOIN"} article_summaries a ON a.file_name = fi.file_name
+        WHERE fi.folder = ?
+        AND ({" OR ".join("fi.file_name GLOB ?" for _ in formats)})
+    """
+    query_params = [folder] + [f"*{fmt}" for fmt in formats]
+    if readState == "read":
+        sql += " AND fi.is_read = 1"
+    elif readState == "unread":
+        sql += " AND fi.is_read = 0"
+    if has_tag_filters:
+        tag_conditions, tag_params = _tag_filter_sql(
+            all_tags or [], any_tags or [], not_any_tags or []
         )
+        sql += " AND " + tag_conditions
+        query_params.extend(tag_params)
 
-        query_params.extend(filenames.keys())
-
-        # Filter by all_tags (AND logic)
-        if all_tags:
-            # For each required tag, join to article_tags and check for match
-            for i, tag in enumerate(all_tags):
-                tag_alias = f"at{i}"
-                tag_join = f"""
-                JOIN article_tags {tag_alias} ON as1.id = {tag_alias}.article_id
-                JOIN tags t{i} ON {tag_alias}.tag_id = t{i}.id AND t{i}.name = ? AND {tag_alias}.matches = 1
-                """
-                sql = sql.replace(
-                    "FROM article_summaries as1",
-                    f"FROM article_summaries as1 {tag_join}",
-                )
-                query_params.append(tag)
-
-        # Filter by any_tags (OR logic)
-        if any_tags:
-            or_conditions = []
-            for tag in any_tags:
-                or_conditions.append("(t_any.name = ? AND at_any.matches = 1)")
-                query_params.append(tag)
-
-            if or_conditions:
-                any_tag_join = """
-                JOIN article_tags at_any ON as1.id = at_any.article_id
-                JOIN tags t_any ON at_any.tag_id = t_any.id
-                """
-                any_tag_where = " AND (" + " OR ".join(or_conditions) + ")"
-
-                # Add the join to the FROM clause
-                sql = sql.replace(
-                    "FROM article_summaries as1",
-                    f"FROM article_summaries as1 {any_tag_join}",
-                )
-                # Add the OR conditions to the WHERE clause
-                sql += any_tag_where
-
-        # Filter by not_any_tags (NOT ANY logic)
-        if not_any_tags:
-            # Create a subquery to exclude articles that have any of the excluded tags
-            not_any_subquery = """
-            NOT EXISTS (
-                SELECT 1 
-                FROM article_tags at_not 
-                JOIN tags t_not ON at_not.tag_id = t_not.id 
-                WHERE as1.id = at_not.article_id 
-                AND at_not.matches = 1 
-                AND t_not.name IN ({})
-            )
-            """.format(
-                ",".join(["?"] * len(not_any_tags))
-            )
-
-            query_params.extend(not_any_tags)
-            sql += " AND " + not_any_subquery
-
-        # Execute query
-        cursor.execute(sql, query_params)
-        matching_files = cursor.fetchall()
-
-        # Build result dictionary
-        matchingArticles = {
-            filenames[filename]: utils.getUrlOfArticle(filenames[filename])
-            for filename, _ in matching_files
-            if filename in filenames
-        }
-        return matchingArticles
-
-    finally:
-        if cursor:
-            cursor.connection.close()
+    with get_connection() as conn:
+        rows = conn.execute(sql, query_params).fetchall()
+
+    fileNamesToSkip = utils.getConfigStore().fileNamesToSkip
+    matchingArticles = {}
+    new_source_urls = {}
+    for path, article_id, source_url in rows:
+        if utils.doesPathContainDotFolders(path) or any(
+            skip in path for skip in fileNamesToSkip
+        ):
+            continue
+        if source_url is None:
+            source_url = utils.getUrlOfArticle(path)
+            if article_id is not None:
+                new_source_urls[article_id] = source_url
+        matchingArticles[path] = source_url
+    if new_source_urls:
+        set_source_urls(new_source_urls)
+    return matchingArticles
@@ -9,7 +9,13 @@ from selenium.webdriver.common.by import By
 import requests
 from selenium import webdriver
 from urllib.parse import urlparse
-from .utils import getConfig, addUrlToUrlFile, getAbsPath, formatUrl
+from .utils import (
+    getConfig,
+    addUrlToUrlFile,
+    getAbsPath,
+    formatUrl,
+    invalidateFileIndex,
+)
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import markdown
@@ -48,6 +54,7 @@ def downloadNewArticles(urlsToAdd):
             addUrlToUrlFile(
                 [formatUrl(urlCopy)], getAbsPath("../storage/alreadyAddedArticles.txt")
             )
+    invalidateFileIndex(saveDirectory)
 
     # Add downloaded URLs to alreadyAddedArticles.txt
 
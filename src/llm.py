@@ -0,0 +1,552 @@
+import os
+import json
+import time
+import hashlib
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from loguru import logger
+import openai
+from openai import AsyncOpenAI
+from . import db
+from .utils import getConfig
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "google/gemini-2.0-flash-001"
+DEFAULT_MAX_CONCURRENCY = 200
+DEFAULT_INITIAL_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 5
+WRITER_BATCH_SIZE = 200
+
+# AIMD tuning: halve the limit on overload, shrink it gently when latency
+# drifts far above the best latency seen, otherwise add ~1 per round trip
+BACKOFF_FACTOR = 0.5
+LATENCY_BACKOFF_FACTOR = 0.9
+LATENCY_TOLERANCE = 3.0
+MAX_RETRY_DELAY = 120.0
+DEFAULT_CACHE_MAX_MB = 256
+CACHE_EVICT_INTERVAL = 500
+CACHE_TOUCH_BATCH_SIZE = 500
+
+_async_client_factory: Optional[Callable[[], Any]] = None
+
+
+def get_api_key() -> str:
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        logger.error("OPENROUTER_API_KEY not found in environment variables")
+        raise ValueError("OPENROUTER_API_KEY not found in environment variables")
+    return api_key
+
+
+class LLMTransportError(Exception):
+    """A request failed for reasons unrelated to its content (rate limiting,
+    server errors, timeouts) even after retrying. Callers must not persist
+    anything for such a request, so it is attempted again in a later run."""
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, LLMTransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class ResponseCache:
+    """Content-addressed store of LLM responses in the articles database.
+
+    A response is keyed by the model, the caller's prompt template version
+    and a hash of the exact request (messages and options such as
+    response_format), so re-running over unchanged articles costs no API
+    calls, while editing a prompt, bumping its version or switching models
+    misses. Least recently used responses are evicted once the cache
+    exceeds llm_cache_max_mb; 0 disables the cache. Hit times are written in
+    batches of CACHE_TOUCH_BATCH_SIZE, and before every eviction, so a cached
+    rerun does not commit once per request.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stores_since_evict = 0
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self) -> int:
+        return int(float(getConfig().get("llm_cache_max_mb", DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(
+        model: str,
+        template_version: Any,
+        messages: List[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        payload = json.dumps(
+            [model, template_version, messages, options or {}],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            db.ensure_database()
+            response = db.get_cached_llm_response(key)
+        except Exception as e:
+            logger.warning(f"LLM response cache lookup failed: {e}")
+            response = None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[key] = time.time()
+            flush_now = len(self._last_used) >= CACHE_TOUCH_BATCH_SIZE
+        if flush_now:
+            self.flush_access_times()
+        return response
+
+    def flush_access_times(self) -> None:
+        """Write the hit times collected since the last flush."""
+        with self._lock:
+            last_used, self._last_used = self._last_used, {}
+        try:
+            db.touch_llm_responses(last_used)
+        except Exception as e:
+            logger.warning(f"Failed to record LLM cache access times: {e}")
+
+    def put(self, key: str, model: str, response: str) -> None:
+        try:
+            db.store_llm_response(key, model, response)
+        except Exception as e:
+            logger.warning(f"Failed to cache LLM response: {e}")
+            return
+        with self._lock:
+            self._stores_since_evict += 1
+            evict_now = self._stores_since_evict >= CACHE_EVICT_INTERVAL
+            if evict_now:
+                self._stores_since_evict = 0
+        if evict_now:
+            self.evict()
+
+    def evict(self) -> int:
+        self.flush_access_times()
+        try:
+            evicted = db.evict_llm_responses(self.max_bytes)
+        except Exception as e:
+            logger.warning(f"Failed to evict LLM responses: {e}")
+            return 0
+        if evicted:
+            logger.info(f"Evicted {evicted} responses from the LLM response cache")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency controller for requests to one API.
+
+    The limit grows by about one slot per round trip while requests succeed at
+    a healthy latency, is multiplied by BACKOFF_FACTOR on 429/5xx/timeouts
+    (at most once per round trip) and by LATENCY_BACKOFF_FACTOR when latency
+    climbs past LATENCY_TOLERANCE times the best smoothed latency seen. A
+    Retry-After header pauses all new requests until it has elapsed.
+    """
+
+    def __init__(self, initial_limit: int, max_limit: int, min_limit: int = 1):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.in_flight = 0
+        self.waiting = 0
+        self.successes = 0
+        self.throttled = 0
+        self.failures = 0
+        self._latency_ewma: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self) -> None:
+        self.waiting += 1
+        try:
+            while True:
+                delay = self._paused_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                async with self._condition:
+                    await self._condition.wait_for(self._has_capacity)
+                    if self._paused_until <= time.monotonic():
+                        self.in_flight += 1
+                        return
+        finally:
+            self.waiting -= 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency_ewma or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+    def on_success(self, latency: float) -> None:
+        self.successes += 1
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        if self._best_latency is None or self._latency_ewma < self._best_latency:
+            self._best_latency = self._latency_ewma
+        if self._latency_ewma > LATENCY_TOLERANCE * self._best_latency:
+            self._decrease(LATENCY_BACKOFF_FACTOR)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_overload(self, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        self._decrease(BACKOFF_FACTOR)
+        if retry_after:
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + min(retry_after, MAX_RETRY_DELAY)
+            )
+        logger.warning(
+            f"LLM API overloaded, concurrency limit now {int(self.limit)}"
+            + (f", pausing {retry_after:.1f}s" if retry_after else "")
+        )
+
+    def on_failure(self) -> None:
+        self.failures += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "latency_ewma": round(self._latency_ewma or 0.0, 3),
+        }
+
+
+def set_async_client_factory(factory: Optional[Callable[[], Any]] = None) -> None:
+    """Make engines build their client with `factory()` instead of AsyncOpenAI,
+    e.g. to run against a local stub. Passing None restores AsyncOpenAI."""
+    global _async_client_factory
+    _async_client_factory = factory
+
+
+class LLMEngine:
+    """Run chat completions concurrently on one event loop.
+
+    All requests of an engine share a single AsyncOpenAI client (and so one
+    pooled set of keep-alive connections). An AdaptiveLimiter decides how many
+    are in flight, starting at llm_initial_concurrency and never exceeding
+    llm_max_concurrency. Use it as an async context manager inside
+    asyncio.run():
+
+        async with LLMEngine() as engine:
+            text = await engine.complete(messages)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        model: Optional[str] = None,
+        client: Optional[AsyncOpenAI] = None,
+    ):
+        config = getConfig()
+        self.model = model or config.get("ai_model", DEFAULT_MODEL)
+        self.max_concurrency = int(
+            max_concurrency
+            or config.get("llm_max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        )
+        self.initial_concurrency = int(
+            config.get("llm_initial_concurrency", DEFAULT_INITIAL_CONCURRENCY)
+        )
+        self.max_retries = int(config.get("llm_max_retries", DEFAULT_MAX_RETRIES))
+        self._client = client
+        self._owns_client = client is None
+        self.limiter: Optional[AdaptiveLimiter] = None
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def __aenter__(self) -> "LLMEngine":
+        if self._client is None:
+            if _async_client_factory is not None:
+                self._client = _async_client_factory()
+            else:
+                # Retries are handled here so the limiter sees every 429
+                self._client = AsyncOpenAI(
+                    base_url=OPENROUTER_BASE_URL, api_key=get_api_key(), max_retries=0
+                )
+        self.limiter = AdaptiveLimiter(self.initial_concurrency, self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if response_cache.enabled:
+            await asyncio.to_thread(response_cache.evict)
+        logger.info(f"LLM engine metrics: {self.metrics()}")
+        if self._owns_client and self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current concurrency limit, in-flight requests, queue depth and counters."""
+        metrics = self.limiter.metrics() if self.limiter else {}
+        metrics.update(
+            requests=self.requests,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+        )
+        metrics.update(response_cache.stats())
+        return metrics
+
+    async def _send(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        await self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            self.requests += 1
+            response = await self._client.chat.completions.create(
+                model=self.model, messages=messages, **kwargs
+            )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+            if not getattr(response, "choices", None):
+                raise LLMTransportError("Response contained no choices")
+            self.limiter.on_success(time.monotonic() - started)
+            return response.choices[0].message.content
+        finally:
+            await self.limiter.release()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        cache_version: Any = None,
+        cacheable: Optional[Callable[[str], bool]] = None,
+        **kwargs: Any,
+    ) -> str:
+        """Send one chat completion and return the message content.
+
+        With a cache_version the response cache is consulted first, and a
+        fresh response is stored unless `cacheable` rejects it. Rate limiting,
+        server errors and timeouts are retried (honouring Retry-After); once
+        retries are exhausted LLMTransportError is raised.
+        """
+        if cache_version is None or not response_cache.enabled:
+            return await self._complete_uncached(messages, **kwargs)
+        key = ResponseCache.key(self.model, cache_version, messages, kwargs)
+        # The cache lives in SQLite, so it is read and written off the event loop
+        cached = await asyncio.to_thread(response_cache.get, key)
+        if cached is not None:
+            return cached
+        content = await self._complete_uncached(messages, **kwargs)
+        if content is not None and (cacheable is None or cacheable(content)):
+            await asyncio.to_thread(response_cache.put, key, self.model, content)
+        return content
+
+    async def _complete_uncached(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        attempt = 0
+        while True:
+            try:
+                return await self._send(messages, **kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    self.limiter.on_failure()
+                    raise
+                retry_after = _retry_after_seconds(e)
+                self.limiter.on_overload(retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.limiter.on_failure()
+                    raise LLMTransportError(
+                        f"Giving up after {attempt} attempts: {e}"
+                    ) from e
+                delay = retry_after
+                if delay is None:
+                    delay = min(MAX_RETRY_DELAY, 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(min(delay, MAX_RETRY_DELAY))
+
+    async def map(
+        self, worker: Callable[[Any], Awaitable[Any]], items: Iterable[Any]
+    ) -> List[Any]:
+        """Run worker over all items concurrently, returning results in order.
+
+        Exceptions are returned in place of results so one failure does not
+        cancel the rest of the session.
+        """
+        return await asyncio.gather(
+            *(worker(item) for item in items), return_exceptions=True
+        )
+
+
+class StageMetrics:
+    """Throughput and per-item latency of one pipeline stage.
+
+    start(key) and finish(key) bracket the work on one item; calling finish
+    again for the same key extends its latency, so an item that completes in
+    several parts (e.g. one article's tag batches) is measured until its last
+    part is done.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._started: Dict[Any, float] = {}
+        self._finished: Dict[Any, float] = {}
+        self._first_start: Optional[float] = None
+        self._last_finish: Optional[float] = None
+
+    def start(self, key: Any) -> None:
+        now = time.monotonic()
+        self._started.setdefault(key, now)
+        if self._first_start is None:
+            self._first_start = now
+
+    def finish(self, key: Any) -> None:
+        if key not in self._started:
+            return
+        now = time.monotonic()
+        self._finished[key] = now
+        self._last_finish = now
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(
+            end - self._started[key] for key, end in self._finished.items()
+        )
+        if not latencies:
+            return {"stage": self.name, "items": 0}
+        elapsed = max(self._last_finish - self._first_start, 1e-9)
+        return {
+            "stage": self.name,
+            "items": len(latencies),
+            "elapsed_s": round(elapsed, 2),
+            "items_per_s": round(len(latencies) / elapsed, 2),
+            "latency_mean_s": round(sum(latencies) / len(latencies), 3),
+            "latency_p50_s": round(latencies[len(latencies) // 2], 3),
+            "latency_p95_s": round(latencies[int(len(latencies) * 0.95)], 3),
+        }
+
+    def log(self) -> None:
+        logger.info(f"Stage metrics: {self.summary()}")
+
+
+class ResultWriter:
+    """Single consumer that applies results to the database in batches.
+
+    Coroutines put() result rows as they finish; one task drains the queue and
+    hands each batch to `flush` in a worker thread, so SQLite only ever sees
+    one writer and one transaction per batch, and the event loop never waits
+    on a commit. Use as an async context manager; leaving it
+    flushes whatever is still queued, also when the session is interrupted,
+    so completed work survives a crash or Ctrl-C.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], None],
+        batch_size: int = WRITER_BATCH_SIZE,
+    ):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ResultWriter":
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._queue.put_nowait(self._DONE)
+        try:
+            await self._task
+        finally:
+            # On cancellation the writer task may stop before the sentinel;
+            # write whatever it left in the queue
+            self._flush_remaining()
+
+    def put(self, row: Any) -> None:
+        self._queue.put_nowait(row)
+
+    def _flush_remaining(self) -> None:
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not self._DONE:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start : start + self.batch_size])
+
+    def _write(self, batch: List[Any]) -> None:
+        try:
+            self.flush(batch)
+            self.rows_written += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} results: {e}")
+
+    async def _run(self) -> None:
+        done = False
+        while not done:
+            batch = []
+            item = await self._queue.get()
+            while True:
+                if item is self._DONE:
+                    done = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            if batch:
+                # Off the event loop, so a commit never stalls in-flight requests
+                await asyncio.to_thread(self._write, batch)
@@ -1,7 +1,11 @@
 import re
 import json
 from . import utils
-from .utils import getConfig, calculate_normal_hash, calculate_ipfs_hash
+from .utils import (
+    getConfig,
+    calculate_normal_hashes,
+    calculate_ipfs_hash,
+)
 import os
 from collections import defaultdict
 from . import reTitlePDFs
@@ -16,10 +20,11 @@ from . import db
 from .articleSummary import (
     summarize_articles,
     add_files_to_database,
+    migrate_file_hashes,
     remove_nonexistent_files_from_database,
     remove_orphaned_tags_from_database,
 )
-from .articleTagging import main as tag_articles
+from .articleTagging import main as tag_articles, summarize_and_tag_articles
 from loguru import logger
 
 # Configure loguru logger
@@ -42,17 +47,14 @@ def addFileHashesToAlreadyAdded():
     nonHtmlFormats = [fmt for fmt in nonHtmlFormats if fmt not in ["html", "mhtml"]]
     listFile = utils.getAbsPath("../storage/alreadyAddedArticles.txt")
     matchingArticles = utils.getArticlePathsForQuery("*", formats=nonHtmlFormats)
-    alreadyAddedFileNames = str(utils.getUrlsFromFile(listFile)).lower()
-    fileNames = [
-        os.path.basename(filePath)
-        for filePath in matchingArticles
-        if os.path.basename(filePath) not in alreadyAddedFileNames
-    ]
-    fileHashes = [
-        calculate_normal_hash(filePath)
+    alreadyAddedFileNames = utils.getUrlRegistry(listFile)
+    newArticles = [
+        filePath
         for filePath in matchingArticles
         if os.path.basename(filePath) not in alreadyAddedFileNames
     ]
+    fileNames = [os.path.basename(filePath) for filePath in newArticles]
+    fileHashes = list(calculate_normal_hashes(newArticles).values())
     itemsToAdd = list(set(fileNames + fileHashes))
     utils.addUrlToUrlFile(itemsToAdd, listFile)
 
@@ -65,22 +67,21 @@ def addReadFilesHashesToMarkedAsRead():
     matchingArticles = utils.getArticlePathsForQuery(
         "*", formats=nonHtmlFormats, readState="read"
     )
-    alreadyMarkedAsReadFileNames = utils.getUrlsFromFile(listFile)
-    fileNames = [
-        os.path.basename(filePath)
+    alreadyMarkedAsReadFileNames = utils.getUrlRegistry(listFile)
+    hashesByPath = calculate_normal_hashes(matchingArticles)
+    newArticles = [
+        filePath
         for filePath in matchingArticles
         if os.path.basename(filePath) not in alreadyMarkedAsReadFileNames
     ]
+    fileNames = [os.path.basename(filePath) for filePath in newArticles]
     fileHashes = [
-        calculate_normal_hash(filePath)
-        for filePath in matchingArticles
-        if os.path.basename(filePath) not in alreadyMarkedAsReadFileNames
+        hashesByPath[filePath] for filePath in newArticles if filePath in hashesByPath
     ]
     itemsToAdd = list(set(fileNames + fileHashes))
     utils.addUrlToUrlFile(itemsToAdd, listFile)
 
-    fileHashes = [calculate_normal_hash(filePath) for filePath in matchingArticles]
-    utils.addUrlToUrlFile(fileHashes, listFile)
+    utils.addUrlToUrlFile(list(hashesByPath.values()), listFile)
 
 
 def calcUrlsToAdd(onlyRead=False):
@@ -88,11 +89,11 @@ def calcUrlsToAdd(onlyRead=False):
     urlsToAdd = {}
 
     if onlyRead:
-        markedAsReadUrls = utils.getUrlsFromFile(
+        markedAsReadUrls = utils.getUrlRegistry(
             utils.getAbsPath("../storage/markedAsReadArticles.txt")
         )
 
-    allAddedUrls = utils.getUrlsFromFile(
+    allAddedUrls = utils.getUrlRegistry(
         utils.getAbsPath("../storage/alreadyAddedArticles.txt")
     )
     bmBar = bookmarks["roots"]["bookmark_bar"]["children"]
@@ -107,26 +108,22 @@ def calcUrlsToAdd(onlyRead=False):
                     url = link["url"]
                     url = utils.formatUrl(url)
                     if onlyRead:
-                        if (
-                            url.lower() not in "\n".join(markedAsReadUrls).lower()
-                            and url.lower() in "\n".join(allAddedUrls).lower()
-                        ):
+                        if url not in markedAsReadUrls and url in allAddedUrls:
                             url = convertLinks(url, False, True)
                             if url and url[0]:
                                 url = url[0]
                                 if (
-                                    url.lower()
-                                    not in "\n".join(markedAsReadUrls).lower()
-                                    and url.lower() in "\n".join(allAddedUrls).lower()
+                                    url not in markedAsReadUrls
+                                    and url in allAddedUrls
                                 ):
                                     urlsToAdd[subject].append(url)
                                     logger.info(f"added url: {url}")
                     else:
-                        if url.lower() not in "\n".join(allAddedUrls).lower():
+                        if url not in allAddedUrls:
                             url = convertLinks(url, False, True)
                             if url and url[0]:
                                 url = url[0]
-                                if url.lower() not in "\n".join(allAddedUrls).lower():
+                                if url not in allAddedUrls:
                                     urlsToAdd[subject].append(url)
                                     logger.info(f"added url: {url}")
 
@@ -149,16 +146,17 @@ def deleteFilesMarkedToDelete():
 def hideArticlesMarkedAsRead():
     markedAsReadFiles = utils.getArticlesFromList("_READ")
     articleFileFolder = getConfig()["articleFileFolder"]
+    hiddenPaths = []
     for fileName in markedAsReadFiles:
         newPath = utils.hide_file_with_name(fileName, articleFileFolder)
-        if newPath:
-            try:    
-                utils.addUrlToUrlFile(
-                    utils.getUrlOfArticle(newPath),
-                    utils.getAbsPath("../storage/markedAsReadArticles.txt"),
-                )
-            except FileNotFoundError:
-                logger.error(f"Failed to mark {fileName} as read")
+        if newPath and os.path.exists(newPath):
+            hiddenPaths.append(newPath)
+        else:
+            logger.error(f"Failed to mark {fileName} as read")
+    for url in utils.getUrlsOfArticles(hiddenPaths).values():
+        utils.addUrlToUrlFile(
+            url, utils.getAbsPath("../storage/markedAsReadArticles.txt")
+        )
     utils.deleteAllArticlesInList("_READ")
 
 
@@ -182,20 +180,6 @@ def updatePerTagFiles(root_folder):
     tag_files_dir = getConfig()["backupFolderPath"]
     os.makedirs(tag_files_dir, exist_ok=True)
 
-    # Load existing hash data from all JSON files to avoid recalculating hashes
-    existing_hash_data = {}
-    for file_name in os.listdir(tag_files_dir):
-        if file_name.endswith("_files_and_hashes.json"):
-            file_path = os.path.join(tag_files_dir, file_name)
-            try:
-                with open(file_path, "r") as f:
-                    tag_hash_data = json.load(f)
-                    # Add to our master dictionary of file paths and their hashes
-                    existing_hash_data.update(tag_hash_data)
-            except (json.JSONDecodeError, IOError):
-                # If file is corrupted, skip it
-                pass
-
     # Get all tags with article counts
     tags = db.get_all_tags_with_article_count()
 
@@ -204,6 +188,9 @@ def updatePerTagFiles(root_folder):
     tags_processed = 0
     skipped_tags = 0
 
+    # URLs come from the database, so no article has to be opened for them
+    source_urls = db.get_source_urls()
+
     # Process each tag
     for tag_id, tag_name, article_count in tags:
         # Skip tags with 0 articles
@@ -229,19 +216,16 @@ def updatePerTagFiles(root_folder):
                 # Find the full path of the article
                 article_path = os.path.join(root_folder, file_name)
 
-                # Check if we already have hash for this file
-                if article_path in existing_hash_data and os.path.exists(article_path):
-                    # Use existing hash if file exists
-                    file_hash = existing_hash_data[article_path]
-                else:
-                    # Calculate hash only for new or modified files
-                    file_hash = calculate_ipfs_hash(article_path)
+                # Served from the hash cache unless the file changed since last run
+                file_hash = calculate_ipfs_hash(article_path)
 
                 file_data[article_path] = file_hash
 
                 # Add URL and title if available (only for HTML/MHTML files)
                 if article_path.lower().endswith((".html", ".mhtml")):
-                    article_url = utils.getUrlOfArticle(article_path)
+                    _, article_url = source_urls.get(file_name, (None, None))
+                    if article_url is None:
+                        article_url = utils.getUrlOfArticle(article_path)
                     if article_url:
                         # Try to extract a title from the file if possible
                         title_display = os.path.splitext(
@@ -331,6 +315,7 @@ def deleteDuplicateArticleFiles(urls_to_filenames):
                 homeDir, ".local/share/Trash/files/", "DUP_" + fileName.split("/")[-1]
             )
             shutil.move(fileName, dest)
+            utils.invalidateFileIndex(directory)
         else:
             # If url has not been seen in this directory, add it to the set
             dir_seen_urls[directory].add(url)
@@ -346,64 +331,79 @@ def moveDocsToTargetFolder():
 
     logger.info(f"Number of docPaths: {len(docPaths)}")
 
-    alreadyAddedHashes = str(
-        utils.getUrlsFromFile(utils.getAbsPath("../storage/alreadyAddedArticles.txt"))
+    alreadyAddedHashes = utils.getUrlRegistry(
+        utils.getAbsPath("../storage/alreadyAddedArticles.txt")
     )
-    markedAsReadHashes = str(
-        utils.getUrlsFromFile(utils.getAbsPath("../storage/markedAsReadArticles.txt"))
+    markedAsReadHashes = utils.getUrlRegistry(
+        utils.getAbsPath("../storage/markedAsReadArticles.txt")
     )
 
-    for docPath in docPaths:
-        docHash = calculate_normal_hash(docPath)
-        if docHash in alreadyAddedHashes:
-            logger.info(f"Skipping importing duplicate file: {docPath}")
-            docFileName = docPath.split("/")[-1]
-            homeDir = os.path.expanduser("~")
-            erroDocPath = os.path.join(
-                homeDir, ".local/share/Trash/files/", "DUPLICATE_" + docFileName
-            )
-            shutil.move(docPath, erroDocPath)
-            continue
+    # Registries may still hold hashes from an earlier fileHashMode
+    docHashes = utils.calculate_registry_hashes(docPaths)
+    with alreadyAddedHashes.batch():
+        for docPath in docPaths:
+            hashes = docHashes.get(docPath)
+            if not hashes:
+                continue
+            docHash = hashes[0]
+            if any(fileHash in alreadyAddedHashes for fileHash in hashes):
+                logger.info(f"Skipping importing duplicate file: {docPath}")
+                docFileName = docPath.split("/")[-1]
+                homeDir = os.path.expanduser("~")
+                erroDocPath = os.path.join(
+                    homeDir, ".local/share/Trash/files/", "DUPLICATE_" + docFileName
+                )
+                shutil.move(docPath, erroDocPath)
+                continue
 
-        docName = docPath.split("/")[-1]
+            docName = docPath.split("/")[-1]
 
-        # Create a unique filename if needed
-        baseName, extension = os.path.splitext(docName)
-        uniqueName = docName
-        counter = 1
-        while os.path.exists(os.path.join(targetFolder, uniqueName)):
-            uniqueName = f"{baseName}_{counter}{extension}"
-            counter += 1
+            # Create a unique filename if needed
+            baseName, extension = os.path.splitext(docName)
+            uniqueName = docName
+            counter = 1
+            while os.path.exists(os.path.join(targetFolder, uniqueName)):
+                uniqueName = f"{baseName}_{counter}{extension}"
+                counter += 1
 
-        targetPath = os.path.join(targetFolder, uniqueName)
+            targetPath = os.path.join(targetFolder, uniqueName)
 
-        if docHash in markedAsReadHashes:
-            targetPath = os.path.join(targetFolder, "." + uniqueName)
-            logger.info(f"Marking as read: {docName}")
+            if any(fileHash in markedAsReadHashes for fileHash in hashes):
+                targetPath = os.path.join(targetFolder, "." + uniqueName)
+                logger.info(f"Marking as read: {docName}")
 
-        logger.info(f"Moving {docName} to {targetPath} derived from {docPath}")
-        shutil.move(docPath, targetPath)
+            logger.info(f"Moving {docName} to {targetPath} derived from {docPath}")
+            shutil.move(docPath, targetPath)
 
-        utils.addUrlToUrlFile(
-            [docHash, os.path.basename(targetPath)],
-            utils.getAbsPath("../storage/alreadyAddedArticles.txt"),
-        )
+            utils.addUrlToUrlFile(
+                [docHash, os.path.basename(targetPath)],
+                utils.getAbsPath("../storage/alreadyAddedArticles.txt"),
+            )
+
+    if docPaths:
+        utils.invalidateFileIndex()
 
 
 def deleteDuplicateFiles(directory_path):
     duplicate_size_files = defaultdict(list)
 
+    all_paths = []
     for root, _, filenames in os.walk(directory_path):
         if any(part.startswith(".") for part in root.split(os.sep)):
             continue  ###why is this here... mightn't it result in duplicate hidden articles remaining?
 
         for filename in filenames:
-            full_path = os.path.join(root, filename)
-            file_size = os.path.getsize(full_path)
-            file_hash = calculate_normal_hash(full_path)
-            unique_key = f"{file_size}_{file_hash}_{root}"
+            all_paths.append(os.path.join(root, filename))
+
+    file_hashes = calculate_normal_hashes(all_paths)
+    for full_path in all_paths:
+        if full_path not in file_hashes:
+            continue
+        root = os.path.dirname(full_path)
+        file_size = os.path.getsize(full_path)
+        unique_key = f"{file_size}_{file_hashes[full_path]}_{root}"
 
-            duplicate_size_files[unique_key].append(full_path)
+        duplicate_size_files[unique_key].append(full_path)
 
     for unique_key, file_paths in duplicate_size_files.items():
         if len(file_paths) > 1:
@@ -446,10 +446,15 @@ def deleteDuplicateFiles(directory_path):
                     homeDir, ".local/share/Trash/files/", file_path.split("/")[-1]
                 )
                 shutil.move(file_path, dest)
+                utils.invalidateFileIndex(os.path.dirname(file_path))
 
 
 def main():
-    logger.info("remove nonexistent files from database")
+    logger.info("refresh file index")
+    utils.refreshFileIndex()
+    logger.info("migrate article hashes if the fingerprint mode changed")
+    migrate_file_hashes()
+    logger.info("reconcile renamed files and remove nonexistent files from database")
     db.remove_duplicate_file_entries()
     remove_nonexistent_files_from_database()
     logger.info("remove orphaned tags from database")
@@ -463,10 +468,14 @@ def main():
     reTitlePDFs.retitleAllPDFs()
     logger.info("add files to database")
     add_files_to_database()
-    logger.info("summarize articles")
-    summarize_articles()
-    logger.info("tag articles")
-    tag_articles()
+    if getConfig().get("summarize_and_tag_pipeline", False):
+        logger.info("summarize and tag articles")
+        summarize_and_tag_articles()
+    else:
+        logger.info("summarize articles")
+        summarize_articles()
+        logger.info("tag articles")
+        tag_articles()
     logger.info("move docs to target folder")
     moveDocsToTargetFolder()
     logger.info("update urlList files")
@@ -497,6 +506,11 @@ def main():
     logger.info("update @voice lists")
     appendToLists()
     modifyListFiles()
+    logger.info("compact url registries with many duplicate entries")
+    for registryFile in ("alreadyAddedArticles.txt", "markedAsReadArticles.txt"):
+        registry = utils.getUrlRegistry(utils.getAbsPath(f"../storage/{registryFile}"))
+        if registry.compactIfNeeded():
+            logger.info(f"Compacted {registryFile}")
 
 
 if __name__ == "__main__":
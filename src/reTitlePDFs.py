@@ -6,7 +6,7 @@ import re
 
 
 def removeIllegalChars(pdfTitle):
-    illegalChars = getConfig()["illegalFileNameChars"]
+    illegalChars = utils.getConfigStore().illegalFileNameChars
     for char in illegalChars:
         pdfTitle = pdfTitle.replace(char, "")
 
@@ -101,6 +101,7 @@ def retitlePDFsInFolder(folderPath):
             suffix += 1
         newPdfPaths.append(newPath)
         os.rename(pdfPath, newPath)
+    utils.invalidateFileIndex(folderPath)
 
 
 def retitleAllPDFs():
@@ -1,11 +1,20 @@
-from utils import getConfig
-import utils
 import argparse
 import subprocess
 import os
+import sys
 import cProfile
 import pstats
 
+# Handle imports for both package and direct script execution
+if __name__ == "__main__":
+    # When run directly, add parent directory to path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.utils import getConfig
+    import src.utils as utils
+else:
+    from .utils import getConfig
+    from . import utils
+
 
 def getCMDArguments():
     parser = argparse.ArgumentParser(description="Boolean search saved articles")
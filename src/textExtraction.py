@@ -942,6 +942,86 @@ def extract_text_from_file(
         raise TextExtractionError(error_msg, already_logged=True)
 
 
+# Phrases typical of cookie walls, paywalls, login prompts and page chrome
+BOILERPLATE_PHRASES = (
+    "cookie",
+    "use cookies",
+    "accept all",
+    "privacy policy",
+    "terms of service",
+    "terms of use",
+    "subscribe",
+    "subscription",
+    "sign in",
+    "sign up",
+    "log in",
+    "create an account",
+    "already a subscriber",
+    "enable javascript",
+    "all rights reserved",
+    "newsletter",
+    "advertisement",
+    "table of contents",
+    "continue reading",
+)
+# Whole words only, so "design in" or a recipe's "cookies" don't count
+_BOILERPLATE_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(p) for p in BOILERPLATE_PHRASES) + r")\b"
+)
+
+
+def assess_text_insufficiency(text: str) -> Tuple[float, List[str]]:
+    """Estimate locally whether extracted text is too thin to summarize.
+
+    Combines word count, unique-token ratio, boilerplate phrase density and the
+    share of very short lines (navigation, tables of contents) into a
+    confidence between 0 and 1 that the text is a cookie wall, paywall stub or
+    fragment rather than an article. No signal scores above 0.5 on its own, so
+    at least two must agree before the confidence reaches 0.8.
+
+    Args:
+        text: Extracted text
+
+    Returns:
+        Tuple[float, List[str]]: Confidence and the signals that contributed
+    """
+    words = text.split()
+    word_count = len(words)
+    score = 0.0
+    reasons = []
+
+    if word_count < 50:
+        score += 0.5
+        reasons.append(f"only {word_count} words")
+    elif word_count < 150:
+        score += 0.4
+        reasons.append(f"only {word_count} words")
+
+    if word_count >= 100:
+        unique_ratio = len({word.lower() for word in words}) / word_count
+        if unique_ratio < 0.1:
+            score += 0.5
+            reasons.append(f"repetitive ({unique_ratio:.2f} unique tokens)")
+
+    if word_count:
+        density = len(_BOILERPLATE_PATTERN.findall(text.lower())) * 100 / word_count
+        if density >= 3:
+            score += 0.5
+            reasons.append(f"boilerplate ({density:.1f} phrases per 100 words)")
+        elif density >= 1.5:
+            score += 0.25
+            reasons.append(f"some boilerplate ({density:.1f} phrases per 100 words)")
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) >= 10:
+        short_share = sum(1 for line in lines if len(line.split()) < 4) / len(lines)
+        if short_share > 0.85:
+            score += 0.4
+            reasons.append(f"fragmented ({short_share:.0%} of lines under 4 words)")
+
+    return min(score, 1.0), reasons
+
+
 def clean_text(text: str) -> str:
     """Clean extracted text.
 
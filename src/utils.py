@@ -10,6 +10,11 @@ from os import path
 import json
 from pathlib import Path
 import os
+import mmap
+import threading
+import time
+import concurrent.futures
+from contextlib import contextmanager
 
 # import snscrape.modules.twitter as sntwitter
 # import snscrape
@@ -62,6 +67,7 @@ def delete_file_with_name(file_name, folder):
             dest = os.path.join(homeDir, ".local/share/Trash/files/", fileName)
             if os.path.exists(matching_file):
                 shutil.move(matching_file, dest)
+                invalidateFileIndex(folder)
                 print(f"Deleted {matching_file}")
                 notFound = False
         except OSError:
@@ -89,6 +95,7 @@ def hide_file_with_name(orgFileName, folder):
                 hiddenFilePath = os.path.join(folder, hiddenFileName)
                 print(f"HIDING {fileName} >> {hiddenFilePath}")
                 shutil.move(matching_file, hiddenFilePath)
+                invalidateFileIndex(folder)
                 notFound = False
                 return hiddenFilePath
         except OSError:
@@ -100,9 +107,53 @@ def hide_file_with_name(orgFileName, folder):
     return orgFileName
 
 
+# Expanded t.co links are cached in the database; failures are retried sooner
+SHORT_URL_CACHE_TTL = 180 * 24 * 3600
+SHORT_URL_FAILURE_TTL = 24 * 3600
+
+_shortUrlResolver = urlexpander.expand
+_expandedShortUrls = {}
+
+
+def setShortUrlResolver(resolver=None):
+    """Resolve short URLs with `resolver(url) -> url` instead of urlexpander
+    (e.g. a local stub in tests). Passing None restores urlexpander."""
+    global _shortUrlResolver
+    _shortUrlResolver = resolver if resolver else urlexpander.expand
+    _expandedShortUrls.clear()
+
+
+def expandShortUrl(url):
+    """Expand a t.co link, using the persistent cache where possible. Returns
+    the URL unchanged if it cannot be resolved."""
+    from . import db
+
+    if url in _expandedShortUrls:
+        return _expandedShortUrls[url]
+    now = time.time()
+    db.ensure_database()
+    cached = db.get_expanded_url(url)
+    if cached:
+        expandedUrl, resolvedAt = cached
+        ttl = SHORT_URL_CACHE_TTL if expandedUrl else SHORT_URL_FAILURE_TTL
+        if now - resolvedAt < ttl:
+            _expandedShortUrls[url] = expandedUrl or url
+            return _expandedShortUrls[url]
+    try:
+        expandedUrl = _shortUrlResolver(url)
+    except Exception as e:
+        print(f"Failed to expand {url}: {e}")
+        expandedUrl = None
+    if not expandedUrl or expandedUrl == url:
+        expandedUrl = None
+    db.store_expanded_url(url, expandedUrl, now)
+    _expandedShortUrls[url] = expandedUrl or url
+    return _expandedShortUrls[url]
+
+
 def formatUrl(url):
     if "t.co/" in url:
-        url = urlexpander.expand(url)
+        url = expandShortUrl(url.strip())
     url = url.replace("medium.com", "scribe.rip").strip()
     url = url.replace("en.m.wikipedia.org", "en.wikipedia.org").strip()
     if "gist.github.com" in url:
@@ -118,6 +169,10 @@ def formatUrl(url):
     return url
 
 
+# The Hyperionics and Snapshot-Content-Location markers sit in the file header
+URL_HEAD_READ_SIZE = 128 * 1024
+
+
 def getUrlOfArticle(articleFilePath):
     extractedUrl = ""
     articleExtension = articleFilePath.split(".")[-1].lower()
@@ -126,10 +181,9 @@ def getUrlOfArticle(articleFilePath):
         return ""
 
     with open(articleFilePath, errors="ignore") as _file:
-        fileText = _file.read()
-        urlPatterns = getConfig()["urlPatterns"]
-        for urlPattern in urlPatterns:
-            match = re.search(urlPattern, fileText)
+        fileText = _file.read(URL_HEAD_READ_SIZE)
+        for urlPattern in getConfigStore().urlPatterns:
+            match = urlPattern.search(fileText)
             if match:
                 extractedUrl = formatUrl(match.group(1).strip())
                 break
@@ -137,27 +191,54 @@ def getUrlOfArticle(articleFilePath):
     return extractedUrl
 
 
+def getUrlsOfArticles(articlePaths):
+    """Return {path: url} using the source_url column cached in the database.
+    Only files without a cached URL are read, and their URLs are cached."""
+    from . import db
+
+    knownUrls = db.get_source_urls()
+    urls = {}
+    newSourceUrls = {}
+    for articlePath in articlePaths:
+        fileName = os.path.basename(articlePath)
+        # Hidden (read) files may still be registered under their unhidden name
+        articleId, url = knownUrls.get(fileName) or knownUrls.get(
+            fileName.lstrip("."), (None, None)
+        )
+        if url is None:
+            url = getUrlOfArticle(articlePath)
+            if articleId is not None:
+                newSourceUrls[articleId] = url
+        urls[articlePath] = url
+    if newSourceUrls:
+        db.set_source_urls(newSourceUrls)
+    return urls
+
+
 def markArticlesWithUrlsAsRead(readUrls, articleFolder):
     articleUrls = searchArticlesForQuery("*", [], "", ["html", "mhtml"])
     articleUrls = {v: k for k, v in articleUrls.items()}
-    for url in readUrls:
-        if url in articleUrls:
-            try:
-                hide_file_with_name(
-                    articleUrls[url].split("/")[-1], getConfig()["articleFileFolder"]
-                )
-            except OSError:
-                print(f"Error hiding {articleUrls[url]}")
-        addUrlToUrlFile(url, getAbsPath("./../storage/markedAsReadArticles.txt"))
+    markedAsRead = getUrlRegistry(getAbsPath("./../storage/markedAsReadArticles.txt"))
+    with markedAsRead.batch():
+        for url in readUrls:
+            if url in articleUrls:
+                try:
+                    hide_file_with_name(
+                        articleUrls[url].split("/")[-1],
+                        getConfig()["articleFileFolder"],
+                    )
+                except OSError:
+                    print(f"Error hiding {articleUrls[url]}")
+            markedAsRead.add(url)
 
 
 def getUrlsFromFile(urlFile):
+    # Entries are formatted by addUrlToUrlFile when written, not on every read
     allUrls = []
     with open(urlFile, "r") as allUrlsFile:
         fileText = allUrlsFile.read().strip()
         for url in fileText.strip().split("\n"):
-            url = formatUrl(url)
-            allUrls.append(url)
+            allUrls.append(url.strip())
     return allUrls
 
 
@@ -167,23 +248,142 @@ def removeDupesPreserveOrder(seq):
     return [x for x in seq if not (x in seen or seen_add(x))]
 
 
-def addUrlToUrlFile(urlOrUrls, urlFile, overwrite=False):
-    mode = "w" if overwrite else "a"
-    with open(urlFile, mode) as allUrlsFile:
-        if type(urlOrUrls) == type([]):
-            for url in urlOrUrls:
-                url = formatUrl(url)
-                allUrlsFile.write(url + "\n")
+class UrlRegistry:
+    """Append-only registry file such as storage/alreadyAddedArticles.txt, with
+    a case-insensitive in-memory set for exact O(1) lookups.
+
+    add() formats new entries and appends only those not already present;
+    inside a batch() they are buffered and written in one append. Duplicates
+    already in older files are harmless and are dropped by compact(), which
+    compactIfNeeded() only runs once they make up a noticeable share of the
+    file. Use getUrlRegistry() to share one instance per file.
+    """
+
+    def __init__(self, urlFile):
+        self.urlFile = urlFile
+        self._entries = None
+        self._pending = None
+        self._redundantLines = 0
+        self._lines = 0
+
+    def _getEntries(self):
+        if self._entries is None:
+            if os.path.exists(self.urlFile):
+                urls = getUrlsFromFile(self.urlFile)
+                self._entries = {url.lower() for url in urls if url}
+                # Lines compact() would drop: blanks and exact duplicates
+                self._lines = len(urls)
+                self._redundantLines = len(urls) - len({url for url in urls if url})
+            else:
+                self._entries = set()
+                self._lines = self._redundantLines = 0
+        return self._entries
+
+    def __contains__(self, url):
+        return url.strip().lower() in self._getEntries()
+
+    def __len__(self):
+        return len(self._getEntries())
+
+    def add(self, urlOrUrls):
+        """Append the entries that are not registered yet; returns how many."""
+        urls = urlOrUrls if type(urlOrUrls) == type([]) else [urlOrUrls]
+        entries = self._getEntries()
+        newUrls = []
+        for url in urls:
+            url = formatUrl(url)
+            if url and url.lower() not in entries:
+                entries.add(url.lower())
+                newUrls.append(url)
+        self._lines += len(newUrls)
+        if self._pending is not None:
+            self._pending.extend(newUrls)
         else:
-            urlOrUrls = formatUrl(urlOrUrls)
-            allUrlsFile.write(urlOrUrls + "\n")
+            self._append(newUrls)
+        return len(newUrls)
+
+    @contextmanager
+    def batch(self):
+        """Buffer add() calls and append them to the file in one write."""
+        if self._pending is not None:
+            yield self
+            return
+        self._pending = []
+        try:
+            yield self
+        finally:
+            pending, self._pending = self._pending, None
+            self._append(pending)
+
+    def _append(self, urls):
+        if not urls:
+            return
+        needsNewline = False
+        if os.path.exists(self.urlFile) and os.path.getsize(self.urlFile) > 0:
+            with open(self.urlFile, "rb") as allUrlsFile:
+                allUrlsFile.seek(-1, os.SEEK_END)
+                needsNewline = allUrlsFile.read(1) != b"\n"
+        with open(self.urlFile, "a") as allUrlsFile:
+            if needsNewline:
+                allUrlsFile.write("\n")
+            allUrlsFile.write("".join(url + "\n" for url in urls))
+
+    def overwrite(self, urls):
+        """Replace the file with urls, keeping the first of entries that are
+        equal once formatted, ignoring case (the same rule as membership)."""
+        seen = set()
+        uniqueUrls = []
+        for url in urls:
+            url = formatUrl(url)
+            if url and url.lower() not in seen:
+                seen.add(url.lower())
+                uniqueUrls.append(url)
+        urls = uniqueUrls
+        with open(self.urlFile, "w") as allUrlsFile:
+            allUrlsFile.write("".join(url + "\n" for url in urls))
+        self._entries = None
+
+    def compact(self):
+        """Rewrite the file without duplicate or blank entries."""
+        if os.path.exists(self.urlFile):
+            removeDupeUrlsInFile(self.urlFile)
+        self._entries = None
+
+    def compactIfNeeded(self, minRedundantLines=1000, maxRedundantRatio=0.1):
+        """compact() once redundant lines pass both thresholds; returns whether
+        the file was rewritten."""
+        self._getEntries()
+        if (
+            self._redundantLines < minRedundantLines
+            or self._redundantLines <= self._lines * maxRedundantRatio
+        ):
+            return False
+        self.compact()
+        return True
+
+
+_urlRegistries = {}
 
-    removeDupeUrlsInFile(urlFile)
+
+def getUrlRegistry(urlFile):
+    """Return the registry for urlFile, loading it on first use this run."""
+    urlFile = os.path.abspath(urlFile)
+    if urlFile not in _urlRegistries:
+        _urlRegistries[urlFile] = UrlRegistry(urlFile)
+    return _urlRegistries[urlFile]
+
+
+def addUrlToUrlFile(urlOrUrls, urlFile, overwrite=False):
+    registry = getUrlRegistry(urlFile)
+    if overwrite:
+        registry.overwrite(urlOrUrls if type(urlOrUrls) == type([]) else [urlOrUrls])
+    else:
+        registry.add(urlOrUrls)
 
 
 def removeDupeUrlsInFile(urlFile):
     urls = getUrlsFromFile(urlFile)
-    uniqueUrls = removeDupesPreserveOrder(urls)
+    uniqueUrls = removeDupesPreserveOrder(url for url in urls if url)
     with open(urlFile, "w") as allUrlsFile:
         for url in uniqueUrls:
             allUrlsFile.write(url + "\n")
@@ -282,9 +482,9 @@ def getInvalidBlogSubstrings():
 
 def isValidBlog(url):
     validBlog = True
-    invalidBlogSubstrings = getInvalidBlogSubstrings()
-    for substring in invalidBlogSubstrings:
-        if substring.lower() in url.lower():
+    lowerUrl = url.lower()
+    for substring in getConfigStore().invalidBlogSubstrings:
+        if substring in lowerUrl:
             validBlog = False
 
     if not url.startswith("http"):
@@ -300,12 +500,83 @@ def getAbsPath(relPath):
     return fullPath
 
 
+class ConfigStore:
+    """config.json parsed once per process and re-read only when its mtime
+    changes; the mtime is checked at most once per CONFIG_CHECK_INTERVAL. Lookups derived from it (compiled urlPatterns, frozen sets) are
+    rebuilt on every reload.
+
+    The parsed dict is shared by all callers, so it must not be mutated.
+    Tests can inject() a config dict, which is served until reset().
+    """
+
+    def __init__(self, configPath):
+        self.configPath = configPath
+        self.config = {}
+        self._mtimeNs = None
+        self._checkedAt = 0.0
+        self._injected = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._injected:
+            return self.config
+        now = time.monotonic()
+        if self._mtimeNs is not None and now - self._checkedAt < CONFIG_CHECK_INTERVAL:
+            return self.config
+        mtimeNs = os.stat(self.configPath).st_mtime_ns
+        if mtimeNs != self._mtimeNs:
+            with self._lock:
+                if mtimeNs != self._mtimeNs:
+                    with open(self.configPath) as configFile:
+                        self._setConfig(json.loads(configFile.read()))
+                    self._mtimeNs = mtimeNs
+        self._checkedAt = now
+        return self.config
+
+    def inject(self, config):
+        with self._lock:
+            self._injected = True
+            self._setConfig(config)
+
+    def reset(self):
+        with self._lock:
+            self._injected = False
+            self._mtimeNs = None
+
+    def _setConfig(self, config):
+        self.urlPatterns = tuple(
+            re.compile(pattern) for pattern in config.get("urlPatterns", [])
+        )
+        self.fileNamesToSkip = frozenset(config.get("fileNamesToSkip", []))
+        self.illegalFileNameChars = frozenset(config.get("illegalFileNameChars", []))
+        self.invalidBlogSubstrings = tuple(
+            substring.lower() for substring in config.get("invalidBlogSubstrings", [])
+        )
+        self.config = config
+
+
+# Seconds between checks of config.json's mtime, so hot loops calling
+# getConfig() don't stat the file on every call
+CONFIG_CHECK_INTERVAL = 1.0
+configStore = ConfigStore(getAbsPath("../config.json"))
+
+
 def getConfig():
-    configFileName = getAbsPath("../config.json")
-    with open(configFileName) as config:
-        config = json.loads(config.read())
+    return configStore.get()
+
 
-    return config
+def getConfigStore():
+    configStore.get()
+    return configStore
+
+
+def injectConfig(config):
+    """Serve `config` from getConfig() instead of config.json (for tests)."""
+    configStore.inject(config)
+
+
+def resetConfig():
+    configStore.reset()
 
 
 def getArticlesFromList(listName):
@@ -444,12 +715,85 @@ def doesPathContainDotFolders(path):
     return False
 
 
+# Folders whose file index has been refreshed during this run
+_freshFileIndexFolders = set()
+
+
+def scanFolder(folderPath):
+    """Stat every file directly inside folderPath in a single os.scandir pass."""
+    entries = []
+    with os.scandir(folderPath) as dirEntries:
+        for entry in dirEntries:
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append(
+                (
+                    os.path.join(folderPath, entry.name),
+                    entry.name,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    stat.st_ino,
+                    entry.name.startswith("."),
+                )
+            )
+    return entries
+
+
+def refreshFileIndex(folderPath=""):
+    """Rescan a folder and sync the result into the persistent file index."""
+    from . import db
+
+    folderPath = folderPath if folderPath else getConfig()["articleFileFolder"]
+    folderPath = (folderPath + "/").replace("//", "/")
+    entries = scanFolder(folderPath) if os.path.isdir(folderPath) else []
+    db.ensure_database()
+    changedCount, removedCount = db.sync_file_index(folderPath, entries)
+    _freshFileIndexFolders.add(folderPath)
+    return changedCount, removedCount
+
+
+def invalidateFileIndex(folderPath=None):
+    """Force the next query against folderPath (or every folder) to rescan it.
+
+    Call this after moving, renaming or deleting files so the index never
+    serves paths that no longer exist.
+    """
+    if folderPath is None:
+        _freshFileIndexFolders.clear()
+    else:
+        _freshFileIndexFolders.discard((folderPath + "/").replace("//", "/"))
+
+
+def ensureFileIndex(folderPath=""):
+    """Refresh the file index for folderPath unless that already happened this
+    run, and return the folder path in the form the index stores it."""
+    folderPath = folderPath if folderPath else getConfig()["articleFileFolder"]
+    folderPath = (folderPath + "/").replace("//", "/")
+    if folderPath not in _freshFileIndexFolders:
+        refreshFileIndex(folderPath)
+    return folderPath
+
+
+def getIndexedFileNames(folderPath):
+    from . import db
+
+    return db.get_indexed_file_names(ensureFileIndex(folderPath))
+
+
 def getArticlePathsForQuery(
     query, formats=[], folderPath="", fileName=None, recursive=False, readState=None
 ):
     """
     Get article paths matching the query, formats, and optional fileName.
 
+    Top-level listings are served from the persistent file index, which is
+    rescanned at most once per run (or after invalidateFileIndex). Recursive
+    and fileName searches still glob the filesystem.
+
     Args:
         query: Query to match against article paths (set to "*" for all articles)
         formats: List of file formats to include
@@ -464,7 +808,25 @@ def getArticlePathsForQuery(
     folderPath = (folderPath + "/").replace("//", "/")
     formats = getConfig()["docFormatsToMove"] if not formats else formats
     formats = formats if query == "*" else ["html", "mhtml"]  # important!
-    fileNamesToSkip = getConfig()["fileNamesToSkip"]
+    fileNamesToSkip = getConfigStore().fileNamesToSkip
+
+    if not recursive and not fileName:
+        allArticlesPaths = []
+        for name in getIndexedFileNames(folderPath):
+            isRead = name.startswith(".")
+            if (readState == "read" and not isRead) or (
+                readState == "unread" and isRead
+            ):
+                continue
+            if not any(name.endswith(fmt) for fmt in formats):
+                continue
+            allArticlesPaths.append(os.path.join(folderPath, name))
+        return [
+            path
+            for path in allArticlesPaths
+            if not doesPathContainDotFolders(path)
+            and not any(skip in path for skip in fileNamesToSkip)
+        ]
 
     # Treat fileName as a format if provided, otherwise use provided formats
     search_targets = [glob.escape(fileName)] if fileName else formats
@@ -521,7 +883,7 @@ def searchArticlesForQuery(query, subjects=[], readState="", formats=[], path=""
     if (
         "pdf" in formats and query != "*" and path == ""
     ):  # i.e. if we want to search in the text of the pdf files
-        formats.remove("pdf")
+        formats = [fmt for fmt in formats if fmt != "pdf"]
     allArticlesPaths.extend(
         getArticlePathsForQuery(query, formats, path, readState=readState)
     )
@@ -549,9 +911,9 @@ def searchArticlesForQuery(query, subjects=[], readState="", formats=[], path=""
         if not matchInAricle:
             continue
 
-        matchingArticles[articlePath] = getUrlOfArticle(articlePath)
+        matchingArticles[articlePath] = None
 
-    return matchingArticles
+    return getUrlsOfArticles(matchingArticles)
 
 
 def createListIfNotExists(listPath):
@@ -669,8 +1031,8 @@ def getSrcUrlOfGitbook(articlePath):
     return None
 
 
-def calculate_ipfs_hash(file_path):
-    """Calculate IPFS hash for a file."""
+def compute_ipfs_hash(file_path):
+    """Calculate IPFS hash for a file, reading it in full."""
 
     def as_chunks(stream: BytesIO, chunk_size: int) -> Iterable[bytes]:
         while len((chunk := stream.read(chunk_size))) > 0:
@@ -682,7 +1044,29 @@ def calculate_ipfs_hash(file_path):
         return result
 
 
-def calculate_normal_hash(file_path):
+# Fingerprint modes for calculate_normal_hash, mapped to their hash cache column.
+# "legacy" is the original middle-4KB sample, kept so old hashes can be migrated.
+FILE_HASH_MODES = {
+    "full": "full_hash",
+    "sampled": "sampled_hash",
+    "legacy": "normal_hash",
+}
+DEFAULT_FILE_HASH_MODE = "full"
+HASH_READ_SIZE = 1024 * 1024
+SAMPLE_WINDOW_SIZE = 64 * 1024
+SAMPLE_WINDOW_COUNT = 9
+
+
+def getFileHashMode():
+    mode = getConfig().get("fileHashMode", DEFAULT_FILE_HASH_MODE)
+    if mode not in FILE_HASH_MODES:
+        raise ValueError(
+            f"Unknown fileHashMode {mode!r}, expected one of {list(FILE_HASH_MODES)}"
+        )
+    return mode
+
+
+def compute_legacy_hash(file_path):
     hasher = hashlib.sha256()
     file_size = os.path.getsize(file_path)
 
@@ -696,3 +1080,132 @@ def calculate_normal_hash(file_path):
             hasher.update(f.read(4096))
 
     return hasher.hexdigest()
+
+
+def compute_full_hash(file_path):
+    """SHA-256 of the whole file. Large files are mapped rather than read so
+    hashing works straight off the page cache and releases the GIL."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size <= HASH_READ_SIZE:
+            hasher.update(f.read())
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for offset in range(0, file_size, HASH_READ_SIZE):
+                    hasher.update(view[offset : offset + HASH_READ_SIZE])
+    return hasher.hexdigest()
+
+
+def compute_sampled_hash(file_path):
+    """SHA-256 over the file size plus evenly spaced windows from head to tail.
+
+    Files no larger than the combined windows are hashed in full, so their
+    fingerprint matches compute_full_hash.
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= SAMPLE_WINDOW_SIZE * SAMPLE_WINDOW_COUNT:
+        return compute_full_hash(file_path)
+    hasher = hashlib.sha256()
+    hasher.update(file_size.to_bytes(8, "little"))
+    lastOffset = file_size - SAMPLE_WINDOW_SIZE
+    with open(file_path, "rb") as f:
+        for i in range(SAMPLE_WINDOW_COUNT):
+            f.seek(lastOffset * i // (SAMPLE_WINDOW_COUNT - 1))
+            hasher.update(f.read(SAMPLE_WINDOW_SIZE))
+    return hasher.hexdigest()
+
+
+HASH_FUNCTIONS = {
+    "full": compute_full_hash,
+    "sampled": compute_sampled_hash,
+    "legacy": compute_legacy_hash,
+}
+
+
+def compute_normal_hash(file_path, mode=None):
+    return HASH_FUNCTIONS[mode or getFileHashMode()](file_path)
+
+
+def getCachedFileHash(file_path, hashColumn, computeHash):
+    """Return a file hash from the database cache, computing it only when the
+    file's (path, size, mtime_ns) differs from what was cached."""
+    from . import db
+
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    db.ensure_database()
+    fileHash = db.get_cached_file_hash(
+        file_path, stat.st_size, stat.st_mtime_ns, hashColumn
+    )
+    if fileHash is None:
+        fileHash = computeHash(file_path)
+        db.store_file_hash(
+            file_path, stat.st_size, stat.st_mtime_ns, hashColumn, fileHash
+        )
+    return fileHash
+
+
+def calculate_ipfs_hash(file_path):
+    return getCachedFileHash(file_path, "ipfs_hash", compute_ipfs_hash)
+
+
+def calculate_normal_hash(file_path, mode=None):
+    mode = mode or getFileHashMode()
+    return getCachedFileHash(file_path, FILE_HASH_MODES[mode], HASH_FUNCTIONS[mode])
+
+
+def calculate_normal_hashes(filePaths, mode=None, maxWorkers=None):
+    """Fingerprint many files in a thread pool.
+
+    Returns:
+        Dict mapping each readable path to its hash; unreadable paths are left out.
+    """
+    mode = mode or getFileHashMode()
+    maxWorkers = maxWorkers or getConfig().get("hashWorkers")
+    hashes = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futureToPath = {
+            executor.submit(calculate_normal_hash, filePath, mode): filePath
+            for filePath in filePaths
+        }
+        for future in concurrent.futures.as_completed(futureToPath):
+            filePath = futureToPath[future]
+            try:
+                hashes[filePath] = future.result()
+            except OSError as e:
+                print(f"Error hashing {filePath}: {e}")
+    return hashes
+
+
+def getRegistryHashModes():
+    """Fingerprint modes whose hashes may appear in the already-added and
+    marked-as-read registries: the current mode first, then every mode the
+    library was migrated away from, since registries keep their old entries."""
+    from . import db
+
+    mode = getFileHashMode()
+    db.ensure_database()
+    previousModes = (db.get_setting("registry_hash_modes") or "").split(",")
+    return [mode] + [
+        previousMode
+        for previousMode in previousModes
+        if previousMode in FILE_HASH_MODES and previousMode != mode
+    ]
+
+
+def calculate_registry_hashes(filePaths):
+    """Fingerprint files under every mode in getRegistryHashModes.
+
+    Returns:
+        Dict mapping each readable path to its hashes, current mode first.
+    """
+    hashesByMode = [
+        calculate_normal_hashes(filePaths, mode) for mode in getRegistryHashModes()
+    ]
+    return {
+        filePath: [hashes[filePath] for hashes in hashesByMode if filePath in hashes]
+        for filePath in filePaths
+        if filePath in hashesByMode[0]
+    }
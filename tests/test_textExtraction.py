@@ -0,0 +1,22 @@
+from src.textExtraction import assess_text_insufficiency
+
+
+def test_boilerplate_phrases_only_match_whole_words():
+    text = (
+        "The studio's approach to interface design in small teams grew out of a "
+        "blog in which the founders shared recipes, including one for oatmeal "
+        "cookies, alongside notes on typography and layout."
+    )
+    confidence, reasons = assess_text_insufficiency(text)
+    assert not any("boilerplate" in reason for reason in reasons)
+    assert confidence < 0.8
+
+
+def test_cookie_wall_is_insufficient():
+    text = (
+        "We use cookies. Accept all cookies to continue. Privacy policy. "
+        "Already a subscriber? Sign in."
+    )
+    confidence, reasons = assess_text_insufficiency(text)
+    assert any("boilerplate" in reason for reason in reasons)
+    assert confidence >= 0.8
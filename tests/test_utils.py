@@ -0,0 +1,23 @@
+from src import utils
+
+
+def test_overwrite_drops_duplicate_urls(tmp_path):
+    urlFile = tmp_path / "searchResultUrls.txt"
+    urlFile.write_text("https://old.example.com/\n")
+    utils.addUrlToUrlFile(
+        [
+            "https://example.com/a",
+            "https://example.com/b",
+            "https://EXAMPLE.com/a",
+            "https://example.com/a",
+        ],
+        str(urlFile),
+        True,
+    )
+    assert urlFile.read_text().splitlines() == [
+        "https://example.com/a",
+        "https://example.com/b",
+    ]
+    registry = utils.getUrlRegistry(str(urlFile))
+    assert "https://example.com/a" in registry
+    assert "https://old.example.com/" not in registry